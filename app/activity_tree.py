@@ -0,0 +1,162 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# Кэш дерева активностей: "1" — включен (по умолчанию), "0" — все запросы идут в базу данных.
+ACTIVITY_CACHE = os.getenv("ACTIVITY_CACHE", "1")
+# Время жизни кэша в секундах (0 — без ограничения). Ограничивает расхождение между процессами,
+# так как изменения, сделанные в другом процессе, сюда не доходят.
+ACTIVITY_CACHE_TTL = float(os.getenv("ACTIVITY_CACHE_TTL", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class _ActivityNode:
+    """Узел дерева активностей."""
+    __slots__ = ("id", "name", "parent_id", "depth", "children", "descendants")
+
+    def __init__(self, activity_id: int, name: str, parent_id):
+        self.id = activity_id
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = 0  # Глубина от корня (0 — корневая активность)
+        self.children = []  # ID дочерних активностей по возрастанию
+        self.descendants = {}  # {ID потомка: расстояние до него}, включая саму активность
+
+
+class ActivityTree:
+    """
+    Кэш дерева активностей в памяти процесса: родитель, дети, глубина и множество потомков для каждого узла.
+
+    Загружается при старте приложения и дополняется при создании активностей через crud (событие "activities").
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._nodes = None
+        self._ids = []
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True, если кэш загружен."""
+        return self._nodes is not None
+
+    def load(self, db: Session):
+        """Загружает все активности из базы данных и подписывается на создание новых."""
+        rows = db.query(models.Activity.id, models.Activity.name, models.Activity.parent_id).order_by(
+            models.Activity.id).all()
+        nodes = {activity_id: _ActivityNode(activity_id, name, parent_id) for activity_id, name, parent_id in rows}
+        for node in nodes.values():
+            self._link_ancestors(nodes, node)
+        for node in nodes.values():
+            if node.parent_id in nodes:
+                # Ребро, замыкающее цикл в parent_id (родитель — потомок самой активности), не добавляется
+                # в children, иначе вложенные дочерние активности в ответах стали бы бесконечными.
+                if node.parent_id in node.descendants:
+                    logger.warning("Activity %s is its own ancestor (parent_id cycle)", node.id)
+                else:
+                    nodes[node.parent_id].children.append(node.id)
+
+        with self._lock:
+            self._nodes = nodes
+            self._ids = sorted(nodes)
+            self._loaded_at = time.monotonic()
+        events.subscribe("activities", self._on_activities_created)
+
+    def clear(self):
+        """Отключает кэш: запросы снова выполняются в базе данных."""
+        events.unsubscribe("activities", self._on_activities_created)
+        with self._lock:
+            self._nodes = None
+            self._ids = []
+
+    def ensure_fresh(self, db: Session) -> bool:
+        """Возвращает True, если кэш можно использовать; перезагружает его, если истек TTL."""
+        if self._nodes is None:
+            return False
+        if self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            self.load(db)
+        return True
+
+    @staticmethod
+    def _link_ancestors(nodes, node: _ActivityNode):
+        """
+        Вычисляет глубину узла и добавляет его в множества потомков всех предков.
+
+        Подъем по parent_id останавливается на уже пройденном предке, поэтому цикл в данных не зацикливает его.
+        """
+        node.descendants[node.id] = 0
+        distance, parent_id, seen = 0, node.parent_id, {node.id}
+        while parent_id in nodes and parent_id not in seen:
+            seen.add(parent_id)
+            distance += 1
+            nodes[parent_id].descendants[node.id] = distance
+            parent_id = nodes[parent_id].parent_id
+        node.depth = distance
+
+    def _on_activities_created(self, activities: List[models.Activity]):
+        for activity in activities:
+            self.add(activity.id, activity.name, activity.parent_id)
+
+    def add(self, activity_id: int, name: str, parent_id=None):
+        """Добавляет активность в кэш."""
+        with self._lock:
+            if self._nodes is None:
+                return
+            node = _ActivityNode(activity_id, name, parent_id)
+            self._nodes[activity_id] = node
+            if parent_id in self._nodes and parent_id != activity_id:
+                bisect.insort(self._nodes[parent_id].children, activity_id)
+            self._link_ancestors(self._nodes, node)
+            bisect.insort(self._ids, activity_id)
+
+    def _to_dict(self, activity_id: int, depth=None):
+        """
+        Представление активности в формате schemas.Activity с вложенными дочерними активностями.
+
+        depth — число уровней вложенных дочерних активностей (None — без ограничения, 0 — без дочерних).
+        """
+        node = self._nodes[activity_id]
+        children = [] if depth == 0 else [
+            self._to_dict(child_id, None if depth is None else depth - 1) for child_id in node.children]
+        return {"id": node.id, "name": node.name, "parent_id": node.parent_id, "children": children}
+
+    def get(self, activity_id: int, depth=None):
+        """Возвращает активность с дочерними активностями (не глубже depth уровней) или None, если ее нет."""
+        if activity_id not in self._nodes:
+            return None
+        return self._to_dict(activity_id, depth)
+
+    def page(self, skip: int = 0, limit: int = 100, after_id: int = None, depth=None):
+        """Возвращает активности (по возрастанию ID) с пагинацией; after_id — курсор (ID последней активности)."""
+        start = skip if after_id is None else bisect.bisect_right(self._ids, after_id) + skip
+        return [self._to_dict(activity_id, depth) for activity_id in self._ids[start:start + limit]]
+
+    def descendants(self, activity_id: int, max_levels: int):
+        """
+        Возвращает ID активности и ее потомков не глубже max_levels уровней или None, если активности нет в кэше
+        (например, она создана другим процессом или в обход crud): тогда поддерево нужно вычислить в базе данных.
+        """
+        with self._lock:  # add() дополняет множества потомков под этой же блокировкой
+            node = self._nodes.get(activity_id) if self._nodes is not None else None
+            if node is None:
+                return None
+            return [descendant_id for descendant_id, distance in node.descendants.items() if distance < max_levels]
+
+
+activity_tree = ActivityTree(ttl=ACTIVITY_CACHE_TTL)
+
+
+def init_cache(db: Session):
+    """Загружает кэш дерева активностей при старте приложения, если он включен переменной ACTIVITY_CACHE."""
+    if ACTIVITY_CACHE == "1":
+        activity_tree.load(db)
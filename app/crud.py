@@ -1,46 +1,221 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_
-from . import models, schemas
+from sqlalchemy.orm import Session, joinedload, selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import String, Text, and_, cast, or_, insert, select, literal, union_all
+from sqlalchemy.exc import SQLAlchemyError
+from . import models, schemas, geo, events, pagination, search
+from .serialization import subfields, wants
+from .geo_index import building_index
+from .activity_tree import activity_tree
+from .suggest_index import fold, suggest_index
 from typing import List, Optional
+import math
+import os
+
+# Способ обхода иерархии активностей: "closure" — таблица замыкания, "cte" — рекурсивный CTE (без изменения схемы).
+ACTIVITY_HIERARCHY = os.getenv("ACTIVITY_HIERARCHY", "closure")
+# Чтение организаций: "projection" — только нужные ответу столбцы в виде строк и словарей (по умолчанию),
+# "orm" — полноценные объекты models.Organization в identity map сессии.
+ORGANIZATION_READS = os.getenv("ORGANIZATION_READS", "projection")
+# Число уровней вложенных дочерних активностей в ответах по умолчанию (пустое значение — без ограничения).
+ACTIVITY_TREE_DEPTH = int(os.getenv("ACTIVITY_TREE_DEPTH") or -1)
+# Число организаций, которые выгрузка читает из курсора базы данных за раз.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE") or 1000)
+# Число организаций в одном пакете массового создания (один INSERT на таблицу и один commit на пакет).
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE") or 1000)
+
+
+def keyset(query, column, after_id: Optional[int] = None):
+    """
+    Упорядочивает запрос по column и применяет keyset-пагинацию: только строки с column > after_id.
+
+    В отличие от offset, стоимость не растет с номером страницы, а вставка новых строк не сдвигает страницы.
+    """
+    if after_id is not None:
+        query = query.filter(column > after_id)
+    return query.order_by(column)
+
+
+# Таблицы, от которых зависят ответы о сущности (версии — в table_versions).
+ENTITY_TABLES = {
+    "organizations": ("organizations", "organization_phones", "organization_activities"),
+    "buildings": ("buildings",),
+    "activities": ("activities",),
+}
+
+
+def get_table_versions(db: Session, entities) -> List[int]:
+    """
+    Возвращает версии таблиц сущностей (и их телефонов и связей с активностями) одним запросом к table_versions.
+
+    Версии — счетчики изменений, которые увеличивают триггеры базы данных при любой вставке, изменении
+    или удалении строк, поэтому они меняются и при записи из других процессов.
+    """
+    tables = [table for entity in entities for table in ENTITY_TABLES[entity]]
+    versions = dict(db.execute(select(models.TableVersion.name, models.TableVersion.version).where(
+        models.TableVersion.name.in_(tables))).all())
+    return [versions.get(table, 0) for table in tables]
 
 
 # --- Activities ---
 
-def get_activity(db: Session, activity_id: int):
-    """Получает информацию об активности по её ID."""
-    return db.query(models.Activity).options(joinedload(models.Activity.children)).filter(
-        models.Activity.id == activity_id).first()
+def _tree_depth(depth: Optional[int]) -> Optional[int]:
+    """Глубина вложенности дочерних активностей: depth или ACTIVITY_TREE_DEPTH; None — без ограничения."""
+    if depth is None:
+        depth = ACTIVITY_TREE_DEPTH
+    return None if depth < 0 else depth
+
+
+def get_activity(db: Session, activity_id: int, depth: Optional[int] = None):
+    """
+    Получает информацию об активности по её ID с дочерними активностями не глубже depth уровней.
+
+    Дерево берется из кэша дерева активностей, если он включен, иначе загружается одним запросом (_activity_dicts).
+    """
+    if activity_tree.ensure_fresh(db):
+        return activity_tree.get(activity_id, _tree_depth(depth))
+    return _activity_dicts(db, [activity_id], depth).get(activity_id)
+
+
+def get_activities(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                   depth: Optional[int] = None):
+    """
+    Получает список всех активностей с возможностью пагинации (из кэша дерева активностей, если он включен).
+
+    after_id — курсор keyset-пагинации: возвращаются активности с ID больше after_id.
+    depth — число уровней вложенных дочерних активностей (по умолчанию ACTIVITY_TREE_DEPTH).
+    """
+    if activity_tree.ensure_fresh(db):
+        return activity_tree.page(skip, limit, after_id, _tree_depth(depth))
+    query = keyset(db.query(models.Activity.id), models.Activity.id, after_id).offset(skip).limit(limit)
+    activity_ids = [row.id for row in query]
+    activities = _activity_dicts(db, activity_ids, depth)
+    return [activities[activity_id] for activity_id in activity_ids]
 
 
-def get_activities(db: Session, skip: int = 0, limit: int = 100):
-    """Получает список всех активностей с возможностью пагинации."""
-    return db.query(models.Activity).options(joinedload(models.Activity.children)).offset(skip).limit(limit).all()
+def get_activity_by_name(db: Session, name: str, skip: int = 0, limit: int = search.SEARCH_LIMIT,
+                         depth: Optional[int] = None):
+    """
+    Ищет активности по подстроке в имени (без учета регистра), с дочерними активностями не глубже depth уровней.
+
+    Поиск использует индекс имен (search.name_search), результаты упорядочены по релевантности
+    и ограничены skip/limit.
+    """
+    condition, ranking = search.name_search(db, models.Activity, name)
+    activity_ids = [row.id for row in db.query(models.Activity.id).filter(condition).order_by(
+        *ranking).offset(skip).limit(limit)]
+    activities = _activity_dicts(db, activity_ids, depth)
+    return [activities[activity_id] for activity_id in activity_ids]
 
 
-def get_activity_by_name(db: Session, name: str):
-    """Получает активности, имя которых содержит заданную подстроку (без учета регистра)."""
-    return db.query(models.Activity).filter(models.Activity.name.ilike(f"%{name}%")).all()
+# Максимальное число уровней вложенности при рекурсивном поиске по активностям (по ТЗ — 3 уровня).
+MAX_ACTIVITY_LEVELS = 3
 
 
 def create_activity(db: Session, activity: schemas.ActivityCreate):
-    """Создает новую активность."""
+    """Создает новую активность и добавляет ее в таблицу замыкания иерархии."""
     db_activity = models.Activity(**activity.model_dump())
     db.add(db_activity)
+    db.flush()  # Получаем ID для таблицы замыкания
+
+    db.add(models.ActivityClosure(ancestor_id=db_activity.id, descendant_id=db_activity.id, depth=0))
+    if db_activity.parent_id is not None:
+        ancestors = db.query(models.ActivityClosure).filter(
+            models.ActivityClosure.descendant_id == db_activity.parent_id).all()
+        for ancestor in ancestors:
+            db.add(models.ActivityClosure(ancestor_id=ancestor.ancestor_id, descendant_id=db_activity.id,
+                                          depth=ancestor.depth + 1))
+
     db.commit()
     db.refresh(db_activity)
+    events.publish("activities", db_activity)
     return db_activity
 
 
+def rebuild_activity_closure(db: Session):
+    """
+    Полностью пересчитывает таблицу замыкания по полю parent_id.
+
+    Нужна, если активности создавались в обход create_activity (например, seed.py). Цикл в parent_id
+    (например, активность — свой собственный родитель) обрывается на первом повторном предке.
+    """
+    parents = dict(db.query(models.Activity.id, models.Activity.parent_id).all())
+    rows = []
+    for activity_id in parents:
+        ancestor_id, depth, seen = activity_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": activity_id, "depth": depth})
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    db.query(models.ActivityClosure).delete()
+    if rows:
+        db.execute(insert(models.ActivityClosure), rows)
+    db.commit()
+
+
+def _activity_subtree_cte(activity_id: int, max_levels: int):
+    """SELECT с ID активности и ее потомков не глубже max_levels уровней (рекурсивный CTE по parent_id)."""
+    tree = (
+        select(models.Activity.id.label("id"), literal(0).label("depth"))
+        .where(models.Activity.id == activity_id)
+        .cte("activity_tree", recursive=True)
+    )
+    child = aliased(models.Activity)
+    tree = tree.union_all(
+        select(child.id, tree.c.depth + 1)
+        .where(child.parent_id == tree.c.id, tree.c.depth + 1 < max_levels)
+    )
+    return select(tree.c.id)
+
+
+def activity_subtree(activity_id: int, max_levels: int = MAX_ACTIVITY_LEVELS):
+    """
+    Возвращает SELECT с ID активности и ее потомков не глубже max_levels уровней (включая саму активность).
+
+    В зависимости от ACTIVITY_HIERARCHY использует таблицу замыкания или один рекурсивный CTE;
+    в обоих случаях поддерево вычисляется в базе данных за один запрос. Если в таблице замыкания нет строки
+    активности (она создана в обход create_activity, до заполнения таблицы или другим процессом без нее),
+    поддерево в том же запросе вычисляется рекурсивным CTE.
+    """
+    if ACTIVITY_HIERARCHY == "cte":
+        return _activity_subtree_cte(activity_id, max_levels)
+
+    closure = models.ActivityClosure
+    in_closure = select(closure.ancestor_id).where(
+        closure.ancestor_id == activity_id, closure.descendant_id == activity_id).exists()
+    return union_all(
+        select(closure.descendant_id).where(closure.ancestor_id == activity_id, closure.depth < max_levels),
+        _activity_subtree_cte(activity_id, max_levels).where(~in_closure),
+    )
+
+
 # --- Buildings ---
 
-def get_building(db: Session, building_id: int):
-    """Получает информацию о здании по его ID."""
-    return db.query(models.Building).filter(models.Building.id == building_id).first()
+def _building_columns(fields: dict):
+    """Столбцы зданий для запрошенных полей (ID выбирается всегда: он нужен для курсора)."""
+    return [models.Building.id] + [getattr(models.Building, name) for name in fields if name != "id"]
 
 
-def get_buildings(db: Session, skip: int = 0, limit: int = 100):
-    """Получает список всех зданий с возможностью пагинации."""
-    return db.query(models.Building).offset(skip).limit(limit).all()
+def get_building(db: Session, building_id: int, fields: Optional[dict] = None):
+    """Получает информацию о здании по его ID (fields — только запрошенные поля, в виде словаря)."""
+    query = db.query(models.Building).filter(models.Building.id == building_id)
+    if fields is None:
+        return query.first()
+    row = query.with_entities(*_building_columns(fields)).first()
+    return row._asdict() if row is not None else None
+
+
+def get_buildings(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                  fields: Optional[dict] = None):
+    """
+    Получает список всех зданий с возможностью пагинации (after_id — курсор keyset-пагинации).
+
+    Если задан fields, выбираются только запрошенные столбцы, а здания возвращаются словарями.
+    """
+    query = keyset(db.query(models.Building), models.Building.id, after_id).offset(skip).limit(limit)
+    if fields is None:
+        return query.all()
+    return [row._asdict() for row in query.with_entities(*_building_columns(fields))]
 
 
 def create_building(db: Session, building: schemas.BuildingCreate):
@@ -49,27 +224,248 @@ def create_building(db: Session, building: schemas.BuildingCreate):
     db.add(db_building)
     db.commit()
     db.refresh(db_building)
+    events.publish("buildings", db_building)
     return db_building
 
 
 # --- Organizations ---
 
-def get_organization(db: Session, organization_id: int):
-    """Получает информацию об организации по её ID, включая связанные данные."""
+def organization_query(db: Session):
+    """
+    Базовый запрос организаций со связанными данными, общий для всех функций чтения организаций.
+
+    Здание (многие-к-одному) подгружается через JOIN, а коллекции телефонов и активностей — отдельными
+    запросами selectinload (WHERE ... IN (...)). Так JOIN не размножает строки организации на
+    произведение числа телефонов и активностей, а offset/limit применяется к самим организациям.
+    """
     return db.query(models.Organization).options(
         joinedload(models.Organization.building),
-        joinedload(models.Organization.phones),
-        joinedload(models.Organization.activities)
-    ).filter(models.Organization.id == organization_id).first()
+        selectinload(models.Organization.phones),
+        selectinload(models.Organization.activities)
+    )
 
 
-def get_organizations(db: Session, skip: int = 0, limit: int = 100):
-    """Получает список всех организаций с возможностью пагинации, включая связанные данные."""
-    return db.query(models.Organization).options(
-        joinedload(models.Organization.building),
-        joinedload(models.Organization.phones),
-        joinedload(models.Organization.activities)
-    ).offset(skip).limit(limit).all()
+def _activity_subtrees(activity_ids, depth: Optional[int] = None):
+    """
+    Возвращает SELECT с ID активностей activity_ids и их потомков не глубже depth уровней (None — всех).
+
+    Поддеревья вычисляются одним рекурсивным CTE по parent_id, поэтому число запросов не зависит
+    от высоты дерева. Таблица замыкания здесь не используется: parent_id заполнен и у активностей,
+    созданных в обход create_activity. Столбец path (",1,5,") хранит ID на пути от корня поддерева:
+    рекурсия не заходит в активность, уже лежащую на пути, поэтому цикл в parent_id не зацикливает запрос.
+    """
+    tree = (
+        select(models.Activity.id.label("id"), literal(0).label("depth"),
+               cast(literal(",") + cast(models.Activity.id, String) + literal(","), Text).label("path"))
+        .where(models.Activity.id.in_(activity_ids))
+        .cte("activity_tree", recursive=True)
+    )
+    child = aliased(models.Activity)
+    child_key = cast(child.id, String) + literal(",")
+    recursive = select(child.id, tree.c.depth + 1, cast(tree.c.path + child_key, Text)).where(
+        child.parent_id == tree.c.id, ~tree.c.path.contains(literal(",") + child_key))
+    if depth is not None:
+        recursive = recursive.where(tree.c.depth + 1 <= depth)
+    return select(tree.union_all(recursive).c.id)
+
+
+def _activity_rows(db: Session, activity_ids, depth: Optional[int]) -> dict:
+    """Возвращает {ID: строка (id, name, parent_id)} активностей activity_ids и их потомков не глубже depth уровней."""
+    columns = (models.Activity.id, models.Activity.name, models.Activity.parent_id)
+    rows = {}
+    for chunk in _chunks(list(activity_ids)):
+        query = select(*columns).where(models.Activity.id.in_(_activity_subtrees(chunk, depth)))
+        for row in db.execute(query.order_by(models.Activity.id)):
+            rows[row.id] = row
+    return rows
+
+
+def _closes_cycle(parents: dict, activity_id: int) -> bool:
+    """
+    True, если ребро от активности к ее родителю замыкает цикл в parent_id (активность — свой предок).
+
+    parents — {ID: parent_id} загруженных активностей. Такие ребра не попадают в дочерние активности,
+    как и в кэше дерева, иначе вложенные дочерние активности в ответах стали бы бесконечными.
+    """
+    parent_id, seen = parents.get(activity_id), set()
+    while parent_id is not None and parent_id not in seen:
+        if parent_id == activity_id:
+            return True
+        seen.add(parent_id)
+        parent_id = parents.get(parent_id)
+    return False
+
+
+def _load_activity_children(db: Session, organizations):
+    """
+    Загружает дочерние активности (всех уровней) для активностей ORM-организаций одним запросом на каждые 1000 ID.
+
+    Коллекции Activity.children заполняются без ленивых загрузок, которые иначе выполнялись бы
+    при сериализации для каждого узла дерева.
+    """
+    activity_ids = list({activity.id for organization in organizations for activity in organization.activities})
+    activities = {}
+    for chunk in _chunks(activity_ids):
+        for activity in db.query(models.Activity).filter(
+                models.Activity.id.in_(_activity_subtrees(chunk))).order_by(models.Activity.id):
+            activities[activity.id] = activity
+    children = {activity_id: [] for activity_id in activities}
+    parents = {activity_id: activity.parent_id for activity_id, activity in activities.items()}
+    for activity in activities.values():
+        if activity.parent_id in children and not _closes_cycle(parents, activity.id):
+            children[activity.parent_id].append(activity)
+    for activity_id, activity in activities.items():
+        set_committed_value(activity, "children", children[activity_id])
+
+
+def _activity_dicts(db: Session, activity_ids, depth: Optional[int] = None) -> dict:
+    """
+    Возвращает {ID: активность в формате schemas.Activity с вложенными дочерними} для activity_ids.
+
+    depth — число уровней вложенных дочерних активностей (по умолчанию ACTIVITY_TREE_DEPTH, 0 — без дочерних).
+    Берет активности из кэша дерева, если он включен; остальные поддеревья загружаются одним запросом
+    (_activity_rows) и собираются в памяти — без ленивых загрузок Activity.children по уровням.
+    """
+    depth = _tree_depth(depth)
+    activities = {}
+    if activity_tree.ensure_fresh(db):
+        for activity_id in activity_ids:
+            activity = activity_tree.get(activity_id, depth)
+            if activity is not None:
+                activities[activity_id] = activity
+        # Активности, созданные в обход crud (и потому отсутствующие в кэше), загружаются из базы данных.
+        activity_ids = [activity_id for activity_id in activity_ids if activity_id not in activities]
+        if not activity_ids:
+            return activities
+
+    rows = _activity_rows(db, activity_ids, depth)
+    children = {}
+    parents = {row.id: row.parent_id for row in rows.values()}
+    for row in rows.values():  # Строки упорядочены по ID, поэтому и дочерние активности — по ID
+        if row.parent_id in rows and not _closes_cycle(parents, row.id):
+            children.setdefault(row.parent_id, []).append(row.id)
+
+    def build(activity_id, levels):
+        row = rows[activity_id]
+        nested = [] if levels == 0 else [
+            build(child_id, None if levels is None else levels - 1) for child_id in children.get(activity_id, ())]
+        return {"id": row.id, "name": row.name, "parent_id": row.parent_id, "children": nested}
+
+    activities.update((activity_id, build(activity_id, depth)) for activity_id in activity_ids if activity_id in rows)
+    return activities
+
+
+def _organization_dicts(db: Session, rows, fields: Optional[dict] = None) -> list:
+    """
+    Собирает организации в формате schemas.Organization из строк (id, name, building_id).
+
+    Здания, телефоны и активности загружаются групповыми запросами по ID страницы (WHERE ... IN (...))
+    в виде строк Core, без создания ORM-объектов и их учета в identity map. Связанные данные, которых
+    нет в дереве полей fields, не загружаются.
+    """
+    if not rows:
+        return []
+    organization_ids = [row.id for row in rows]
+    organizations = [{"id": row.id, "name": row.name} if wants(fields, "name") else {"id": row.id} for row in rows]
+
+    if wants(fields, "building"):
+        buildings = {}
+        for chunk in _chunks(list({row.building_id for row in rows})):
+            for building in db.execute(select(models.Building.id, models.Building.address, models.Building.latitude,
+                                              models.Building.longitude).where(models.Building.id.in_(chunk))):
+                buildings[building.id] = building._asdict()
+        for organization, row in zip(organizations, rows):
+            organization["building"] = buildings[row.building_id]
+
+    if wants(fields, "phones"):
+        phones = {organization_id: [] for organization_id in organization_ids}
+        for chunk in _chunks(organization_ids):
+            for phone in db.execute(select(models.OrganizationPhone.id, models.OrganizationPhone.phone_number,
+                                           models.OrganizationPhone.organization_id).where(
+                    models.OrganizationPhone.organization_id.in_(chunk)).order_by(models.OrganizationPhone.id)):
+                phones[phone.organization_id].append(phone._asdict())
+        for organization in organizations:
+            organization["phones"] = phones[organization["id"]]
+
+    if wants(fields, "activities"):
+        activity_links = []
+        for chunk in _chunks(organization_ids):
+            activity_links.extend(db.execute(
+                select(models.OrganizationActivity.organization_id, models.OrganizationActivity.activity_id).where(
+                    models.OrganizationActivity.organization_id.in_(chunk)).order_by(
+                    models.OrganizationActivity.organization_id, models.OrganizationActivity.activity_id)).all())
+        depth = None if wants(subfields(fields, "activities"), "children") else 0
+        activities = _activity_dicts(db, {link.activity_id for link in activity_links}, depth)
+        organization_activities = {organization_id: [] for organization_id in organization_ids}
+        for link in activity_links:
+            organization_activities[link.organization_id].append(activities[link.activity_id])
+        for organization in organizations:
+            organization["activities"] = organization_activities[organization["id"]]
+
+    return organizations
+
+
+def _fetch_organizations(db: Session, query, distance=None, fields: Optional[dict] = None):
+    """
+    Выполняет запрос организаций (organization_query с фильтрами, сортировкой и пагинацией).
+
+    При ORGANIZATION_READS=projection из запроса выбираются только столбцы организации, а связанные
+    данные собираются групповыми запросами (_organization_dicts) с учетом дерева полей fields;
+    иначе возвращаются ORM-объекты. distance — необязательное выражение расстояния: его значение
+    проставляется организациям как distance.
+    """
+    if ORGANIZATION_READS == "orm":
+        if distance is None:
+            organizations = query.all()
+            _load_activity_children(db, organizations)
+            return organizations
+        rows = query.add_columns(distance).all()
+        organizations = [organization for organization, _ in rows]
+        _load_activity_children(db, organizations)
+        return _with_distances(organizations, [(value, organization.id) for organization, value in rows])
+
+    columns = [models.Organization.id, models.Organization.name, models.Organization.building_id]
+    if distance is not None:
+        columns.append(distance.label("distance"))
+    rows = query.with_entities(*columns).all()
+    organizations = _organization_dicts(db, rows, fields)
+    if distance is not None:
+        _with_distances(organizations, [(row.distance, row.id) for row in rows])
+    return organizations
+
+
+def get_organization(db: Session, organization_id: int, fields: Optional[dict] = None):
+    """Получает информацию об организации по её ID, включая связанные данные (fields — дерево полей)."""
+    query = organization_query(db).filter(models.Organization.id == organization_id)
+    organizations = _fetch_organizations(db, query, fields=fields)
+    return organizations[0] if organizations else None
+
+
+def get_organizations(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                      fields: Optional[dict] = None):
+    """
+    Получает список всех организаций с возможностью пагинации, включая связанные данные.
+
+    after_id — курсор keyset-пагинации: возвращаются организации с ID больше after_id.
+    fields — дерево запрошенных полей (serialization.parse_fields): связанные данные вне него не загружаются.
+    """
+    query = keyset(organization_query(db), models.Organization.id, after_id)
+    return _fetch_organizations(db, query.offset(skip).limit(limit), fields=fields)
+
+
+def iter_organization_chunks(db: Session, fields: Optional[dict] = None, chunk_size: Optional[int] = None):
+    """
+    Выдает все организации частями (списками словарей в формате schemas.Organization) в порядке ID.
+
+    Организации читаются одним запросом через серверный курсор (yield_per; в PostgreSQL — stream_results)
+    по chunk_size строк (по умолчанию EXPORT_CHUNK_SIZE), а связанные данные каждой части загружаются
+    групповыми запросами (_organization_dicts). Память не растет с числом организаций, а первая часть
+    готова сразу после чтения ее строк.
+    """
+    query = select(models.Organization.id, models.Organization.name, models.Organization.building_id).order_by(
+        models.Organization.id).execution_options(yield_per=chunk_size or EXPORT_CHUNK_SIZE)
+    for rows in db.execute(query).partitions():
+        yield _organization_dicts(db, rows, fields)
 
 
 def create_organization(db: Session, organization: schemas.OrganizationCreate):
@@ -88,20 +484,97 @@ def create_organization(db: Session, organization: schemas.OrganizationCreate):
 
     db.commit()
     db.refresh(db_organization)
+    _load_activity_children(db, [db_organization])  # Дерево для ответа — одним запросом и без ребер циклов
+    events.publish("organizations", db_organization)
     return db_organization
 
 
-def get_organizations_by_building(db: Session, building_id: int, skip: int = 0, limit: int = 100):
-    """Получает список организаций, связанных с определенным зданием, с пагинацией."""
-    return db.query(models.Organization).options(
-        joinedload(models.Organization.building),
-        joinedload(models.Organization.phones),
-        joinedload(models.Organization.activities)
-    ).filter(models.Organization.building_id == building_id).offset(skip).limit(limit).all()
+def _existing_ids(db: Session, model, ids) -> set:
+    """Возвращает подмножество ids, для которых есть записи model (запросами по частям)."""
+    existing = set()
+    for chunk in _chunks(sorted(ids)):
+        existing.update(db.scalars(select(model.id).where(model.id.in_(chunk))))
+    return existing
+
+
+def _insert_organizations(db: Session, organizations: List[schemas.OrganizationCreate]) -> List[int]:
+    """Вставляет организации, их телефоны и связи с активностями многострочными INSERT и возвращает ID."""
+    ids = db.scalars(
+        insert(models.Organization).returning(models.Organization.id, sort_by_parameter_order=True),
+        [{"name": organization.name, "building_id": organization.building_id} for organization in organizations],
+    ).all()
+    phones = [{"organization_id": organization_id, **phone.model_dump()}
+              for organization_id, organization in zip(ids, organizations) for phone in organization.phones]
+    if phones:
+        db.execute(insert(models.OrganizationPhone), phones)
+    links = [{"organization_id": organization_id, "activity_id": activity_id}
+             for organization_id, organization in zip(ids, organizations)
+             for activity_id in dict.fromkeys(organization.activities)]
+    if links:
+        db.execute(insert(models.OrganizationActivity), links)
+    return ids
+
+
+def create_organizations(db: Session, organizations: List[schemas.OrganizationCreate]) -> List[Optional[str]]:
+    """
+    Массово создает организации. Возвращает для каждой из них None (создана) или текст ошибки.
+
+    Здания и активности проверяются по множествам существующих ID (по запросу на таблицу вместо запроса на строку),
+    организации со ссылками на несуществующие записи пропускаются. Остальные вставляются многострочными
+    INSERT ... RETURNING и фиксируются одним commit. Если база данных отклоняет пакет, организации вставляются
+    по одной, чтобы ошибка одной строки не отменяла остальные.
+    """
+    buildings = _existing_ids(db, models.Building, {organization.building_id for organization in organizations})
+    activities = _existing_ids(db, models.Activity,
+                               {activity_id for organization in organizations
+                                for activity_id in organization.activities})
+    errors, valid = [], []
+    for position, organization in enumerate(organizations):
+        missing = sorted(set(organization.activities) - activities)
+        if organization.building_id not in buildings:
+            errors.append(f"Building {organization.building_id} not found")
+        elif missing:
+            errors.append(f"Activities not found: {', '.join(map(str, missing))}")
+        else:
+            errors.append(None)
+            valid.append(position)
+
+    created = []  # (позиция, ID)
+    if valid:
+        try:
+            ids = _insert_organizations(db, [organizations[position] for position in valid])
+            db.commit()
+            created = list(zip(valid, ids))
+        except SQLAlchemyError:
+            db.rollback()
+            for position in valid:
+                try:
+                    created.extend((position, organization_id)
+                                   for organization_id in _insert_organizations(db, [organizations[position]]))
+                    db.commit()
+                except SQLAlchemyError as exc:
+                    db.rollback()
+                    errors[position] = str(getattr(exc, "orig", None) or exc)
+
+    # Одно событие на пакет: кэш ответов сбрасывается один раз, индекс подсказок пополняется одним слиянием.
+    events.publish_many("organizations", [
+        models.Organization(id=organization_id, name=organizations[position].name,
+                            building_id=organizations[position].building_id)
+        for position, organization_id in created])
+    return errors
+
+
+def get_organizations_by_building(db: Session, building_id: int, skip: int = 0, limit: int = 100,
+                                  after_id: Optional[int] = None, fields: Optional[dict] = None):
+    """Получает список организаций, связанных с определенным зданием, с пагинацией (after_id — курсор)."""
+    query = organization_query(db).filter(models.Organization.building_id == building_id)
+    return _fetch_organizations(db, keyset(query, models.Organization.id, after_id).offset(skip).limit(limit),
+                                fields=fields)
 
 
 def get_organizations_by_activity(db: Session, activity_id: int, skip: int = 0, limit: int = 100,
-                                  recursive: bool = False):
+                                  recursive: bool = False, after_id: Optional[int] = None,
+                                  fields: Optional[dict] = None):
     """
     Получает список организаций, связанных с определенной активностью.
 
@@ -111,128 +584,266 @@ def get_organizations_by_activity(db: Session, activity_id: int, skip: int = 0,
         skip: Смещение для пагинации.
         limit: Предел для пагинации.
         recursive: Если True, ищет организации, связанные с дочерними активностями.
+        after_id: Курсор keyset-пагинации (ID последней организации предыдущей страницы).
+        fields: Дерево запрошенных полей (None — все поля).
     """
-    query = db.query(models.Organization).options(
-        joinedload(models.Organization.building),
-        joinedload(models.Organization.phones),
-        joinedload(models.Organization.activities)
-    )
+    query = organization_query(db)
 
     if recursive:
-        # Рекурсивный поиск по дереву деятельностей
-        activities = [activity_id]
-        stack = [activity_id]
-        while stack:
-            current_activity_id = stack.pop()
-            child_activities = db.query(models.Activity.id).filter(
-                models.Activity.parent_id == current_activity_id).all()
-            for child_activity in child_activities:
-                activities.append(child_activity.id)
-                stack.append(child_activity.id)
-
-        # Добавим проверку на превышение глубины рекурсии. По ТЗ ограничение - 3 уровня.
-        activity_levels = {}  # Словарь для хранения уровней вложенности {id_activity: level}
-        activity_levels[activity_id] = 1  # Начинаем с корневой
-        level_stack = [activity_id]  # Стэк, для того чтоб узнать предков.
-        while level_stack:
-            current_act_id = level_stack.pop()
-            child_acts = db.query(models.Activity.id, models.Activity.parent_id).filter(
-                models.Activity.parent_id == current_act_id).all()
-            for child_id, parent_id in child_acts:
-                activity_levels[child_id] = activity_levels[current_act_id] + 1
-                if activity_levels[child_id] <= 3:  # Проверяем глубину
-                    level_stack.append(child_id)
-                else:
-                    print(f"Превышен лимит вложенности для activity c id {child_id}")
-        filtered_activities = [act_id for act_id, level in activity_levels.items() if level <= 3]
-
-        query = query.join(models.OrganizationActivity).filter(
-            models.OrganizationActivity.activity_id.in_(filtered_activities))
+        # Поддерево (до MAX_ACTIVITY_LEVELS уровней) берется из кэша дерева активностей, а без него
+        # (или если активности нет в кэше) вычисляется в том же запросе, что и выборка организаций.
+        subtree = None
+        if activity_tree.ensure_fresh(db):
+            subtree = activity_tree.descendants(activity_id, MAX_ACTIVITY_LEVELS)
+        if subtree is None:
+            subtree = activity_subtree(activity_id)
+        query = query.filter(models.Organization.id.in_(
+            db.query(models.OrganizationActivity.organization_id).filter(
+                models.OrganizationActivity.activity_id.in_(subtree))
+        ))
     else:
         # Поиск только по указанному ID деятельности
         query = query.join(models.OrganizationActivity).filter(models.OrganizationActivity.activity_id == activity_id)
 
-    return query.offset(skip).limit(limit).all()
+    return _fetch_organizations(db, keyset(query, models.Organization.id, after_id).offset(skip).limit(limit),
+                                fields=fields)
+
+
+def _chunks(items, size: int = 1000):
+    """Разбивает список на части, чтобы не превышать лимит параметров в IN (...)."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _organization_pairs(db: Session, building_ids: List[int], activity_ids: Optional[List[int]] = None):
+    """Выбирает пары (id организации, id здания) для организаций из зданий building_ids."""
+    pairs = []
+    for chunk in _chunks(building_ids):
+        query = db.query(models.Organization.id, models.Organization.building_id).filter(
+            models.Organization.building_id.in_(chunk))
+        if activity_ids:
+            query = query.filter(models.Organization.id.in_(
+                db.query(models.OrganizationActivity.organization_id).filter(
+                    models.OrganizationActivity.activity_id.in_(activity_ids))
+            ))
+        pairs.extend(query.all())
+    return pairs
+
+
+def _organizations_by_ids(db: Session, organization_ids: List[int], fields: Optional[dict] = None):
+    """Загружает организации со связанными данными по первичному ключу, сохраняя порядок organization_ids."""
+    if not organization_ids:
+        return []
+    query = organization_query(db).filter(models.Organization.id.in_(organization_ids))
+    organizations = _fetch_organizations(db, query, fields=fields)
+    by_id = {pagination.item_id(organization): organization for organization in organizations}
+    return [by_id[organization_id] for organization_id in organization_ids]
+
+
+def _organizations_in_buildings(db: Session, building_ids: List[int], skip: int, limit: int,
+                                after_id: Optional[int] = None, fields: Optional[dict] = None):
+    """
+    Возвращает страницу организаций (по возрастанию ID), расположенных в зданиях building_ids.
+
+    Сначала выбираются только пары (id организации, id здания), затем полные данные загружаются по первичному
+    ключу лишь для организаций страницы.
+    """
+    organization_ids = sorted(pair.id for pair in _organization_pairs(db, building_ids)
+                              if after_id is None or pair.id > after_id)
+    return _organizations_by_ids(db, organization_ids[skip:skip + limit], fields)
+
+
+def _with_distances(organizations, page):
+    """Проставляет организациям (ORM-объектам или словарям) distance из пар (расстояние, ID организации) страницы."""
+    for organization, (distance, _) in zip(organizations, page):
+        if isinstance(organization, dict):
+            organization["distance"] = distance
+        else:
+            organization.distance = distance
+    return organizations
+
+
+def _buildings_within_radius(db: Session, latitude: float, longitude: float, radius: float):
+    """
+    Возвращает список (расстояние, ID здания) в пределах радиуса (км), отсортированный по расстоянию.
+
+    Использует in-memory индекс, если он включен, иначе — отбор кандидатов по пространственному индексу БД.
+    """
+    if building_index.ensure_fresh(db):
+        return building_index.within_radius(latitude, longitude, radius)
+
+    lat_min, long_min, lat_max, long_max = geo.bounding_box(latitude, longitude, radius)
+    candidates = db.query(models.Building.id, models.Building.latitude, models.Building.longitude).filter(
+        geo.candidate_filter(db, lat_min, long_min, lat_max, long_max)).all()
+    nearby = []
+    for building_id, building_latitude, building_longitude in candidates:
+        distance = geo.haversine(latitude, longitude, building_latitude, building_longitude)
+        if distance <= radius:
+            nearby.append((distance, building_id))
+    nearby.sort()
+    return nearby
+
+
+def _organizations_near(db: Session, latitude: float, longitude: float, radius: float, skip: int, limit: int,
+                        after: Optional[tuple] = None, fields: Optional[dict] = None):
+    """
+    Возвращает страницу организаций в радиусе, используя in-memory индекс зданий.
+
+    Индекс возвращает только n ближайших зданий (частичная сортировка); если в них меньше skip + limit
+    организаций (после курсора after), окно n удваивается, пока страница не заполнится
+    или здания в радиусе не закончатся.
+    """
+    window = skip + limit
+    size = max(window, 1)
+    while True:
+        nearby = building_index.within_radius(latitude, longitude, radius, limit=size)
+        distances = {building_id: distance for distance, building_id in nearby}
+        keys = [(distances[pair.building_id], pair.id) for pair in _organization_pairs(db, list(distances))]
+        if after is not None:
+            keys = [key for key in keys if key > after]
+        if len(keys) >= window or len(nearby) < size:
+            break
+        size *= 2
+
+    page = sorted(keys)[skip:window]
+    return _with_distances(_organizations_by_ids(db, [organization_id for _, organization_id in page], fields), page)
+
+
+# Начальный радиус поиска ближайших организаций (км) и предельный радиус (половина окружности Земли).
+NEAREST_START_RADIUS_KM = 1.0
+NEAREST_MAX_RADIUS_KM = math.pi * geo.EARTH_RADIUS_KM
+
+
+def get_nearest_organizations(db: Session, latitude: float, longitude: float, k: int = 10,
+                              activity_ids: Optional[List[int]] = None, fields: Optional[dict] = None):
+    """
+    Возвращает k ближайших к точке организаций, упорядоченных по расстоянию.
+
+    Поиск ведется расширяющимся кругом по пространственному индексу: радиус увеличивается, пока внутри
+    не окажется k подходящих организаций. Если внутри круга радиуса r есть k организаций, то k ближайших
+    лежат в нем же, поэтому результат точен, а стоимость зависит от плотности зданий вокруг точки,
+    а не от размера таблицы.
+
+    Args:
+        db: Сессия базы данных.
+        latitude: Широта точки.
+        longitude: Долгота точки.
+        k: Количество организаций.
+        activity_ids: Если задан, учитываются только организации с этими видами деятельности.
+        fields: Дерево запрошенных полей (None — все поля).
+    """
+    radius = NEAREST_START_RADIUS_KM
+    while True:
+        nearby = _buildings_within_radius(db, latitude, longitude, radius)
+        pairs = _organization_pairs(db, [building_id for _, building_id in nearby], activity_ids)
+        if len(pairs) >= k or radius >= NEAREST_MAX_RADIUS_KM:
+            break
+        radius = min(radius * 4, NEAREST_MAX_RADIUS_KM)
+
+    distances = {building_id: distance for distance, building_id in nearby}
+    page = sorted((distances[pair.building_id], pair.id) for pair in pairs)[:k]
+    return _with_distances(_organizations_by_ids(db, [organization_id for _, organization_id in page], fields), page)
 
 
 def get_organizations_within_radius(db: Session, latitude: float, longitude: float, radius: float, skip: int = 0,
-                                    limit: int = 100):
+                                    limit: int = 100, after: Optional[tuple] = None, fields: Optional[dict] = None):
     """
     Поиск организаций в заданном радиусе от точки.
     Использует формулу гаверсинусов для расчета расстояния.
+
+    Сначала здания отбираются по описанному прямоугольнику с помощью пространственного индекса
+    (см. geo.candidate_filter), и только для кандидатов вычисляется точное расстояние.
+    Если включен in-memory индекс зданий, здания в радиусе берутся из него.
+
+    Организации упорядочены по (расстояние, ID); каждой проставляется атрибут distance (км).
+    after — курсор keyset-пагинации: пара (расстояние, ID) последней организации предыдущей страницы.
     """
-    earth_radius_km = 6371  # Радиус Земли в километрах
+    if building_index.ensure_fresh(db):
+        return _organizations_near(db, latitude, longitude, radius, skip, limit, after, fields)
+
+    lat_min, long_min, lat_max, long_max = geo.bounding_box(latitude, longitude, radius)
 
     subquery = (
         db.query(
             models.Organization.id,
-            (
-                    earth_radius_km * func.acos(
-                func.cos(func.radians(latitude)) *
-                func.cos(func.radians(models.Building.latitude)) *
-                func.cos(func.radians(models.Building.longitude) - func.radians(longitude)) +
-                func.sin(func.radians(latitude)) *
-                func.sin(func.radians(models.Building.latitude))
-            )
-            ).label("distance")
+            geo.distance_expression(latitude, longitude).label("distance")
         )
         .join(models.Building)
+        .filter(geo.candidate_filter(db, lat_min, long_min, lat_max, long_max))
         .subquery()
     )
 
     query = (
-        db.query(models.Organization)
-        .options(
-            joinedload(models.Organization.building),
-            joinedload(models.Organization.phones),
-            joinedload(models.Organization.activities)
-        )
+        organization_query(db)
         .join(subquery, models.Organization.id == subquery.c.id)
         .filter(subquery.c.distance <= radius)
-        .order_by(subquery.c.distance)  # Сортировка по расстоянию.
+    )
+    if after is not None:
+        after_distance, after_id = after
+        query = query.filter(or_(
+            subquery.c.distance > after_distance,
+            and_(subquery.c.distance == after_distance, models.Organization.id > after_id),
+        ))
+    query = (
+        query
+        .order_by(subquery.c.distance, models.Organization.id)  # Сортировка по расстоянию.
         .offset(skip)
         .limit(limit)
     )
-    return query.all()
+    return _fetch_organizations(db, query, distance=subquery.c.distance, fields=fields)
 
 
 def get_organizations_within_rectangle(db: Session, lat_min: float, long_min: float, lat_max: float, long_max: float,
-                                       skip: int = 0, limit: int = 100):
+                                       skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                                       fields: Optional[dict] = None):
     """
-    Ищет организации находящиеся в прямоугольнике
+    Ищет организации находящиеся в прямоугольнике (по возрастанию ID, after_id — курсор keyset-пагинации)
     """
+    if building_index.ensure_fresh(db):
+        building_ids = building_index.within_rectangle(lat_min, long_min, lat_max, long_max)
+        return _organizations_in_buildings(db, building_ids, skip, limit, after_id, fields)
+
     query = (
-        db.query(models.Organization)
-        .options(
-            joinedload(models.Organization.building),
-            joinedload(models.Organization.phones),
-            joinedload(models.Organization.activities)
-        )
+        organization_query(db)
         .join(models.Building)  # Join с таблицей Building.
-        .filter(
-            models.Building.latitude >= lat_min,
-            models.Building.latitude <= lat_max,
-            models.Building.longitude >= long_min,
-            models.Building.longitude <= long_max,
-        )
-        .offset(skip)
-        .limit(limit)
+        .filter(geo.candidate_filter(db, lat_min, long_min, lat_max, long_max))
     )
-    return query.all()
+    return _fetch_organizations(db, keyset(query, models.Organization.id, after_id).offset(skip).limit(limit),
+                                fields=fields)
 
 
-def get_organization_by_name(db: Session, name: str):
-    """Получает организации, имя которых содержит заданную подстроку (без учета регистра), включая связанные данные."""
-    return (
-        db.query(models.Organization)
-        .options(
-            joinedload(models.Organization.building),
-            joinedload(models.Organization.phones),
-            joinedload(models.Organization.activities)
-        )
-        .filter(models.Organization.name.ilike(f"%{name}%"))
-        .all()
-    )
+def get_organization_by_name(db: Session, name: str, skip: int = 0, limit: int = search.SEARCH_LIMIT,
+                             fields: Optional[dict] = None):
+    """
+    Ищет организации по подстроке в имени (без учета регистра), включая связанные данные.
+
+    Поиск использует индекс имен (search.name_search), результаты упорядочены по релевантности
+    и ограничены skip/limit.
+    """
+    condition, ranking = search.name_search(db, models.Organization, name)
+    query = organization_query(db).filter(condition).order_by(*ranking).offset(skip).limit(limit)
+    return _fetch_organizations(db, query, fields=fields)
+
+
+def get_suggestions(db: Session, prefix: str, limit: int = 10):
+    """
+    Возвращает до limit подсказок {"id", "name", "type"} по началу имени организации или вида деятельности.
+
+    Подсказки берутся из индекса подсказок, если он включен; иначе выбираются из базы данных по началу имени
+    без учета регистра (search.name_prefix, без поиска по началу остальных слов) в том же порядке.
+    """
+    if suggest_index.ensure_fresh(db):
+        return suggest_index.suggest(prefix, limit)
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    suggestions = []
+    for kind, model in (("organization", models.Organization), ("activity", models.Activity)):
+        condition, folded = search.name_prefix(db, model, prefix)
+        query = db.query(model.id, model.name).filter(condition).order_by(folded, model.name, model.id)
+        suggestions.extend({"id": row.id, "name": row.name, "type": kind} for row in query.limit(limit))
+    suggestions.sort(key=lambda item: (fold(item["name"]), item["name"], item["type"], item["id"]))
+    return suggestions[:limit]
 
 
 # --- Organization Phones ---
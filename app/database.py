@@ -1,7 +1,15 @@
+import itertools
 import os
+import threading
+from typing import Union
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from starlette.concurrency import run_in_threadpool
+
+from .db_config import engine_options
 
 
 def get_database_url():
@@ -9,19 +17,89 @@ def get_database_url():
     return os.getenv("DATABASE_URL")
 
 
+def get_replica_urls():
+    """Получает URL реплик для чтения из переменной окружения DATABASE_REPLICA_URLS (через запятую)."""
+    return [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+# Асинхронные драйверы для диалектов, если в DATABASE_URL драйвер не указан явно.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(url: str):
+    """Преобразует URL базы данных в URL с асинхронным драйвером (например, postgresql -> postgresql+asyncpg)."""
+    url = make_url(url)
+    if "+" not in url.drivername:
+        url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    return url
+
+
 DATABASE_URL = get_database_url()
+# Асинхронный режим: "1" — роуты работают с AsyncSession (create_async_engine), иначе — с обычной Session.
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "0") == "1"
 
 # Создаем движок SQLAlchemy.
-engine = create_engine(DATABASE_URL)
+# Синхронный движок нужен всегда: им пользуются загрузка in-memory индексов при старте, seed.py и миграции.
+# Параметры пула и таймаут запросов задаются переменными окружения (см. app/db_config.py).
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 # Создаем класс SessionLocal, который будет использоваться для создания сессий базы данных.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок и фабрика сессий (только при DATABASE_ASYNC=1).
+async_engine = create_async_engine(get_async_database_url(DATABASE_URL),
+                                   **engine_options(DATABASE_URL, is_async=True)) if DATABASE_ASYNC else None
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False) if DATABASE_ASYNC else None
+
+
+
+class ReadSessionFactory:
+    """
+    Фабрика сессий для чтения: выдает сессии фабрик реплик по кругу (round-robin).
+
+    Если реплик нет, используется фабрика основной базы данных.
+    """
+
+    def __init__(self, session_factories):
+        self.size = len(session_factories)
+        self._factories = itertools.cycle(session_factories)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            factory = next(self._factories)
+        return factory()
+
+
+# Реплики для чтения (DATABASE_REPLICA_URLS): GET-запросы распределяются по ним, запись идет в основную базу.
+REPLICA_URLS = get_replica_urls()
+replica_engines = [create_engine(url, **engine_options(url)) for url in REPLICA_URLS]
+ReadSessionLocal = ReadSessionFactory(
+    [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines] or [SessionLocal])
+
+async_replica_engines = [create_async_engine(get_async_database_url(url), **engine_options(url, is_async=True))
+                         for url in REPLICA_URLS] if DATABASE_ASYNC else []
+AsyncReadSessionLocal = ReadSessionFactory(
+    [async_sessionmaker(bind=replica, autoflush=False) for replica in async_replica_engines]
+    or [AsyncSessionLocal]) if DATABASE_ASYNC else None
+
+# Движки приложения по именам (для диагностики пулов соединений).
+ENGINES = {"primary": engine}
+if async_engine is not None:
+    ENGINES["primary_async"] = async_engine.sync_engine
+for number, replica in enumerate(replica_engines):
+    ENGINES[f"replica_{number}"] = replica
+for number, replica in enumerate(async_replica_engines):
+    ENGINES[f"replica_{number}_async"] = replica.sync_engine
+
 # Создаем базовый класс для декларативных моделей.
 Base = declarative_base()
 
 
-def get_db():
+def get_sync_db():
     """
     Функция-генератор для получения сессии базы данных.
 
@@ -33,3 +111,50 @@ def get_db():
         yield db  # Возвращаем сессию
     finally:
         db.close()  # Закрываем сессию
+
+
+async def get_async_db():
+    """
+    Асинхронный аналог get_sync_db: предоставляет AsyncSession и закрывает ее после завершения запроса.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_sync_read_db():
+    """
+    Функция-генератор для получения сессии чтения (реплика, выбранная по кругу, или основная база данных).
+
+    Используется в GET-роутах; изменения через эту сессию не выполняются.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """Асинхронный аналог get_sync_read_db."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+# Зависимости, которые используют роуты: вид сессии определяется переменной DATABASE_ASYNC.
+# get_db — основная база данных (запись), get_read_db — реплики (чтение).
+get_db = get_async_db if DATABASE_ASYNC else get_sync_db
+get_read_db = get_async_read_db if DATABASE_ASYNC else get_sync_read_db
+# Тип сессии, которую получают роуты.
+DbSession = Union[Session, AsyncSession]
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Выполняет синхронную функцию fn(session, *args, **kwargs) (например, из crud), не блокируя цикл событий.
+
+    Для AsyncSession функция выполняется через AsyncSession.run_sync: ввод-вывод идет через асинхронный
+    драйвер, а код crud остается общим для обоих режимов. Для обычной Session функция выполняется в пуле потоков.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Настройки пула соединений (см. README, раздел "Переменные окружения").
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Постоянные соединения пула
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # Дополнительные соединения при пиковой нагрузке
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Ожидание свободного соединения, секунды
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Пересоздание соединений старше N секунд (-1 — никогда)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"  # Проверка соединения перед выдачей из пула
+# Ограничение времени выполнения запроса на стороне сервера, миллисекунды (0 — без ограничения, только PostgreSQL).
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class _TimedPoolMixin:
+    """
+    Добавляет пулу статистику ожидания соединений: число выдач, суммарное и максимальное время получения соединения.
+
+    Время включает ожидание свободного соединения и открытие нового соединения сверх размера пула.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self.wait_count += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool со статистикой ожидания соединений."""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool со статистикой ожидания соединений."""
+
+
+def _statement_timeout_args(url) -> dict:
+    """Параметры подключения, задающие statement_timeout для всех запросов соединения (PostgreSQL)."""
+    if not DB_STATEMENT_TIMEOUT_MS or url.get_backend_name() != "postgresql":
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    """
+    Возвращает параметры create_engine/create_async_engine для URL базы данных.
+
+    SQLite в памяти использует собственный пул на поток, поэтому для него настройки размера пула не применяются.
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    connect_args = _statement_timeout_args(url)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def pool_statistics(name: str, engine) -> dict:
+    """Статистика пула соединений движка (в формате schemas.PoolStatistics)."""
+    pool = engine.pool
+    statistics = {
+        "name": name,
+        "pool_class": type(pool).__name__,
+        "size": None,
+        "checked_in": None,
+        "checked_out": None,
+        "overflow": None,
+        "max_overflow": None,
+        "wait_count": getattr(pool, "wait_count", 0),
+        "wait_time_total_ms": round(getattr(pool, "wait_time_total", 0.0) * 1000, 3),
+        "wait_time_max_ms": round(getattr(pool, "wait_time_max", 0.0) * 1000, 3),
+    }
+    if isinstance(pool, QueuePool):
+        statistics.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    return statistics
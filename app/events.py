@@ -0,0 +1,39 @@
+from collections import defaultdict
+from typing import Any, Callable, List
+
+# Подписчики на события записи: {тип сущности: [callback, ...]}.
+_subscribers = defaultdict(list)
+
+
+def subscribe(entity: str, callback: Callable[[List[Any]], None]):
+    """
+    Подписывает callback на фиксацию (commit) новых объектов указанного типа.
+
+    callback получает список объектов, зафиксированных вместе (один объект или пакет массового создания).
+    """
+    if callback not in _subscribers[entity]:
+        _subscribers[entity].append(callback)
+
+
+def unsubscribe(entity: str, callback: Callable[[List[Any]], None]):
+    """Отменяет подписку callback на события указанного типа."""
+    if callback in _subscribers[entity]:
+        _subscribers[entity].remove(callback)
+
+
+def publish_many(entity: str, objects: List[Any]):
+    """
+    Уведомляет подписчиков о том, что объекты типа entity были зафиксированы в базе данных.
+
+    Вызывается из crud после commit, поэтому подписчики видят только сохраненные данные. Пакет передается
+    подписчикам одним вызовом: кэш ответов сбрасывается один раз, индексы пополняются одним слиянием.
+    """
+    if not objects:
+        return
+    for callback in list(_subscribers[entity]):
+        callback(objects)
+
+
+def publish(entity: str, obj: Any):
+    """Уведомляет подписчиков о фиксации одного объекта типа entity (см. publish_many)."""
+    publish_many(entity, [obj])
@@ -0,0 +1,113 @@
+import math
+import weakref
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, case, func, inspect, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Радиус Земли в километрах.
+EARTH_RADIUS_KM = 6371
+
+# R-tree индекс для SQLite (виртуальная таблица создается миграцией, поэтому не входит в Base.metadata).
+rtree_metadata = MetaData()
+buildings_rtree = Table(
+    "buildings_rtree",
+    rtree_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    Column("min_long", Float),
+    Column("max_long", Float),
+)
+
+# Кэш наличия R-tree таблицы для каждого движка, чтобы не обращаться к каталогу на каждый запрос.
+_rtree_available = weakref.WeakKeyDictionary()
+
+
+def bounding_box(latitude: float, longitude: float, radius: float):
+    """
+    Вычисляет прямоугольник (lat_min, long_min, lat_max, long_max), описанный вокруг круга заданного радиуса (км).
+
+    Если круг накрывает полюс или пересекает 180-й меридиан, прямоугольник расширяется на весь диапазон долгот.
+    """
+    angular_radius = radius / EARTH_RADIUS_KM
+    lat_min = latitude - math.degrees(angular_radius)
+    lat_max = latitude + math.degrees(angular_radius)
+
+    if lat_min <= -90 or lat_max >= 90 or angular_radius >= math.pi / 2:
+        return max(lat_min, -90.0), -180.0, min(lat_max, 90.0), 180.0
+
+    delta_long = math.degrees(math.asin(min(1.0, math.sin(angular_radius) / math.cos(math.radians(latitude)))))
+    long_min = longitude - delta_long
+    long_max = longitude + delta_long
+    if long_min < -180 or long_max > 180:
+        return lat_min, -180.0, lat_max, 180.0
+    return lat_min, long_min, lat_max, long_max
+
+
+def haversine(lat1: float, long1: float, lat2: float, long2: float) -> float:
+    """Расстояние между двумя точками (в километрах) по формуле гаверсинусов."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(long2 - long1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_expression(latitude: float, longitude: float):
+    """
+    SQL-выражение расстояния (км) от точки до здания по формуле гаверсинусов (как haversine).
+
+    Подкоренное выражение ограничивается сверху единицей: из-за ошибок округления оно может на несколько ULP
+    превысить 1, и тогда asin в PostgreSQL завершается ошибкой, а в SQLite возвращает NULL. В отличие от
+    сферической теоремы косинусов, для совпадающих точек оно равно точно 0.
+    """
+    d_phi = func.radians(models.Building.latitude) - math.radians(latitude)
+    d_lambda = func.radians(models.Building.longitude) - math.radians(longitude)
+    a = (func.power(func.sin(d_phi / 2), 2) +
+         math.cos(math.radians(latitude)) * func.cos(func.radians(models.Building.latitude)) *
+         func.power(func.sin(d_lambda / 2), 2))
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(case((a > 1.0, 1.0), else_=a)))
+
+
+def has_rtree(db: Session) -> bool:
+    """Проверяет (с кэшированием), создана ли в SQLite R-tree таблица зданий."""
+    engine = db.get_bind().engine
+    if engine not in _rtree_available:
+        _rtree_available[engine] = inspect(engine).has_table(buildings_rtree.name)
+    return _rtree_available[engine]
+
+
+def candidate_filter(db: Session, lat_min: float, long_min: float, lat_max: float, long_max: float):
+    """
+    Условие отбора зданий-кандидатов внутри прямоугольника, использующее пространственный индекс.
+
+    - PostgreSQL: GiST-индекс по выражению point(longitude, latitude).
+    - SQLite: R-tree таблица buildings_rtree (если она создана миграцией).
+    - Остальные случаи: составной B-tree индекс по (latitude, longitude).
+
+    Точная проверка по колонкам добавляется всегда, поэтому результат не зависит от выбранного индекса.
+    """
+    box_filter = and_(
+        models.Building.latitude.between(lat_min, lat_max),
+        models.Building.longitude.between(long_min, long_max),
+    )
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        in_box = func.point(models.Building.longitude, models.Building.latitude).op("<@")(
+            func.box(func.point(long_min, lat_min), func.point(long_max, lat_max))
+        )
+        return and_(in_box, box_filter)
+
+    if dialect == "sqlite" and has_rtree(db):
+        rtree_ids = select(buildings_rtree.c.id).where(
+            buildings_rtree.c.max_lat >= lat_min,
+            buildings_rtree.c.min_lat <= lat_max,
+            buildings_rtree.c.max_long >= long_min,
+            buildings_rtree.c.min_long <= long_max,
+        )
+        return and_(models.Building.id.in_(rtree_ids), box_filter)
+
+    return box_filter
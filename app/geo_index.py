@@ -0,0 +1,263 @@
+import heapq
+import math
+import os
+import threading
+import time
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from . import events, geo, models
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для GEO_INDEX=numpy
+    np = None
+
+# In-memory индекс зданий: "kdtree" или "numpy"; пустое значение — геозапросы выполняются в базе данных.
+GEO_INDEX = os.getenv("GEO_INDEX", "")
+# Время жизни индекса в секундах (0 — без ограничения): здания, созданные другими процессами, попадают
+# в индекс после его перестроения.
+GEO_INDEX_TTL = float(os.getenv("GEO_INDEX_TTL", "300"))
+
+
+class _Node:
+    """Узел KD-дерева."""
+    __slots__ = ("point", "building_id", "left", "right")
+
+    def __init__(self, point, building_id):
+        self.point = point
+        self.building_id = building_id
+        self.left = None
+        self.right = None
+
+
+class KDTree:
+    """
+    Двумерное KD-дерево по (latitude, longitude).
+
+    Дерево строится сбалансированным из начального набора точек; новые точки вставляются в листья,
+    что достаточно для редких изменений координат зданий.
+    """
+
+    def __init__(self, points=()):
+        items = list(points)
+        self.size = len(items)
+        self.root = self._build(items, 0)
+
+    def _build(self, items, depth):
+        """Рекурсивно строит сбалансированное поддерево из списка (latitude, longitude, building_id)."""
+        if not items:
+            return None
+        axis = depth % 2
+        items.sort(key=lambda item: item[axis])
+        median = len(items) // 2
+        latitude, longitude, building_id = items[median]
+        node = _Node((latitude, longitude), building_id)
+        node.left = self._build(items[:median], depth + 1)
+        node.right = self._build(items[median + 1:], depth + 1)
+        return node
+
+    def insert(self, latitude: float, longitude: float, building_id: int):
+        """Добавляет точку в дерево."""
+        new_node = _Node((latitude, longitude), building_id)
+        self.size += 1
+        if self.root is None:
+            self.root = new_node
+            return
+        node, depth = self.root, 0
+        while True:
+            axis = depth % 2
+            side = "left" if new_node.point[axis] < node.point[axis] else "right"
+            child = getattr(node, side)
+            if child is None:
+                setattr(node, side, new_node)
+                return
+            node, depth = child, depth + 1
+
+    def range(self, lat_min: float, long_min: float, lat_max: float, long_max: float):
+        """Возвращает (latitude, longitude, building_id) всех точек внутри прямоугольника."""
+        low, high = (lat_min, long_min), (lat_max, long_max)
+        found = []
+        stack = [(self.root, 0)] if self.root is not None else []
+        while stack:
+            node, depth = stack.pop()
+            latitude, longitude = node.point
+            if lat_min <= latitude <= lat_max and long_min <= longitude <= long_max:
+                found.append((latitude, longitude, node.building_id))
+            axis = depth % 2
+            if node.left is not None and low[axis] <= node.point[axis]:
+                stack.append((node.left, depth + 1))
+            if node.right is not None and high[axis] >= node.point[axis]:
+                stack.append((node.right, depth + 1))
+        return found
+
+    def within_rectangle(self, lat_min: float, long_min: float, lat_max: float, long_max: float):
+        """Возвращает ID зданий внутри прямоугольника."""
+        return [building_id for _, _, building_id in self.range(lat_min, long_min, lat_max, long_max)]
+
+    def within_radius(self, latitude: float, longitude: float, radius: float, limit: int = None):
+        """Возвращает (расстояние, ID здания) в пределах радиуса, отсортированные по расстоянию (не более limit)."""
+        lat_min, long_min, lat_max, long_max = geo.bounding_box(latitude, longitude, radius)
+        found = []
+        for lat, long, building_id in self.range(lat_min, long_min, lat_max, long_max):
+            distance = geo.haversine(latitude, longitude, lat, long)
+            if distance <= radius:
+                found.append((distance, building_id))
+        if limit is not None and limit < len(found):
+            return heapq.nsmallest(limit, found)
+        found.sort()
+        return found
+
+
+class CoordinateArrays:
+    """
+    Координаты зданий в непрерывных массивах numpy.
+
+    Расстояния до всех зданий вычисляются одним векторизованным проходом (формула гаверсинусов),
+    а для окна пагинации используется частичная сортировка (argpartition) вместо полной.
+    Новые здания дописываются в конец массивов с удвоением емкости.
+    """
+
+    def __init__(self, points=()):
+        if np is None:
+            raise RuntimeError("GEO_INDEX=numpy requires the numpy package (poetry install --extras geo)")
+        items = list(points)
+        capacity = max(len(items), 16)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._lat = np.zeros(capacity, dtype=np.float64)
+        self._long = np.zeros(capacity, dtype=np.float64)
+        if items:
+            self._lat[:len(items)], self._long[:len(items)], self._ids[:len(items)] = zip(*items)
+        self._lat_rad = np.radians(self._lat)
+        self._long_rad = np.radians(self._long)
+        self._cos_lat = np.cos(self._lat_rad)
+        self.size = len(items)
+
+    def insert(self, latitude: float, longitude: float, building_id: int):
+        """Добавляет точку в конец массивов (размер увеличивается после записи, поэтому чтение безопасно)."""
+        if self.size == len(self._ids):
+            capacity = 2 * len(self._ids)
+            for name in ("_ids", "_lat", "_long", "_lat_rad", "_long_rad", "_cos_lat"):
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                setattr(self, name, grown)
+        position = self.size
+        self._ids[position] = building_id
+        self._lat[position] = latitude
+        self._long[position] = longitude
+        self._lat_rad[position] = math.radians(latitude)
+        self._long_rad[position] = math.radians(longitude)
+        self._cos_lat[position] = math.cos(math.radians(latitude))
+        self.size = position + 1
+
+    def within_rectangle(self, lat_min: float, long_min: float, lat_max: float, long_max: float):
+        """Возвращает ID зданий внутри прямоугольника."""
+        size = self.size
+        lat, long = self._lat[:size], self._long[:size]
+        mask = (lat >= lat_min) & (lat <= lat_max) & (long >= long_min) & (long <= long_max)
+        return self._ids[:size][mask].tolist()
+
+    def within_radius(self, latitude: float, longitude: float, radius: float, limit: int = None):
+        """Возвращает (расстояние, ID здания) в пределах радиуса, отсортированные по расстоянию (не более limit)."""
+        size = self.size
+        phi = math.radians(latitude)
+        lam = math.radians(longitude)
+        a = (np.sin((self._lat_rad[:size] - phi) / 2) ** 2 +
+             math.cos(phi) * self._cos_lat[:size] * np.sin((self._long_rad[:size] - lam) / 2) ** 2)
+        distances = 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+        candidates = np.flatnonzero(distances <= radius)
+        if limit is not None and limit < len(candidates):
+            candidates = candidates[np.argpartition(distances[candidates], limit - 1)[:limit]]
+        order = candidates[np.argsort(distances[candidates], kind="stable")]
+        return list(zip(distances[order].tolist(), self._ids[order].tolist()))
+
+
+# Доступные структуры in-memory индекса.
+BACKENDS = {
+    "kdtree": KDTree,
+    "numpy": CoordinateArrays,
+}
+
+
+class BuildingIndex:
+    """
+    In-memory индекс координат зданий.
+
+    Строится при старте приложения и обновляется при создании зданий через crud (событие "buildings").
+    Хранит данные в одной из структур BACKENDS.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._structure = None
+        self._backend = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True, если индекс построен и может обслуживать запросы."""
+        return self._structure is not None
+
+    def __len__(self):
+        return self._structure.size if self._structure is not None else 0
+
+    def load(self, db: Session, backend: str = "kdtree"):
+        """Строит индекс по всем зданиям из базы данных и подписывается на создание новых."""
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown GEO_INDEX backend: {backend}")
+        rows = db.query(models.Building.id, models.Building.latitude, models.Building.longitude).all()
+        structure = BACKENDS[backend]((latitude, longitude, building_id) for building_id, latitude, longitude in rows)
+        with self._lock:
+            self._structure = structure
+            self._backend = backend
+            self._loaded_at = time.monotonic()
+        events.subscribe("buildings", self._on_buildings_created)
+
+    def clear(self):
+        """Отключает индекс: геозапросы снова выполняются в базе данных."""
+        events.unsubscribe("buildings", self._on_buildings_created)
+        with self._lock:
+            self._structure = None
+
+    def ensure_fresh(self, db: Session) -> bool:
+        """Возвращает True, если индекс можно использовать; перестраивает его той же структурой, если истек TTL."""
+        if self._structure is None:
+            return False
+        if self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            self.load(db, backend=self._backend)
+        return True
+
+    def _on_buildings_created(self, buildings: List[models.Building]):
+        for building in buildings:
+            self.add(building.id, building.latitude, building.longitude)
+
+    def add(self, building_id: int, latitude: float, longitude: float):
+        """Добавляет здание в индекс."""
+        with self._lock:
+            if self._structure is not None:
+                self._structure.insert(latitude, longitude, building_id)
+
+    def within_rectangle(self, lat_min: float, long_min: float, lat_max: float, long_max: float):
+        """Возвращает ID зданий внутри прямоугольника."""
+        return self._structure.within_rectangle(lat_min, long_min, lat_max, long_max)
+
+    def within_radius(self, latitude: float, longitude: float, radius: float, limit: int = None):
+        """
+        Возвращает список (расстояние, ID здания) в пределах радиуса (км), отсортированный по расстоянию.
+
+        Если задан limit, возвращаются только limit ближайших зданий.
+        """
+        return self._structure.within_radius(latitude, longitude, radius, limit)
+
+
+building_index = BuildingIndex(ttl=GEO_INDEX_TTL)
+
+
+def init_index(db: Session):
+    """Строит in-memory индекс при старте приложения, если он включен переменной окружения GEO_INDEX."""
+    if GEO_INDEX:
+        building_index.load(db, backend=GEO_INDEX)
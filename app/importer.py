@@ -0,0 +1,332 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from typing import Callable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+
+# Таблицы, ID которых назначает загрузчик, в порядке записи пакета: строки ссылаются только на предыдущие.
+ID_MODELS = {
+    "activities": models.Activity,
+    "buildings": models.Building,
+    "organizations": models.Organization,
+    "organization_phones": models.OrganizationPhone,
+}
+MODELS = {**ID_MODELS, "organization_activities": models.OrganizationActivity}
+# Разделитель списков (activities, phones) в ячейках CSV.
+CSV_LIST_SEPARATOR = "|"
+CSV_LIST_FIELDS = ("activities", "phones")
+
+
+def read_records(path: str, file_format: str) -> Iterator:
+    """
+    Читает записи файла потоком: строки NDJSON (разбираются при добавлении) или словари строк CSV.
+
+    Пустые строки NDJSON и пустые ячейки CSV пропускаются; списки в ячейках CSV разделяются CSV_LIST_SEPARATOR.
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            for row in csv.DictReader(file):
+                record = {field: value for field, value in row.items() if field and value}
+                for field in CSV_LIST_FIELDS:
+                    if field in record:
+                        record[field] = record[field].split(CSV_LIST_SEPARATOR)
+                yield record
+        else:
+            for line in file:
+                if line.strip():
+                    yield line
+
+
+def _validate(schema, **values):
+    """Проверяет значения схемой; ошибки pydantic превращаются в ValueError с коротким текстом."""
+    try:
+        return schema(**values)
+    except ValidationError as error:
+        raise ValueError("; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors()))
+
+
+class Importer:
+    """
+    Потоковый загрузчик зданий, видов деятельности, организаций и телефонов.
+
+    Записи ссылаются друг на друга по ключам из файла (поле key), а не по ID базы данных. ID назначаются
+    загрузчиком по порядку начиная с максимальных ID таблиц, поэтому внешние ключи разрешаются по словарям
+    «ключ → ID» в памяти без flush на каждую строку, а пакет записывается одной командой на таблицу
+    (COPY в PostgreSQL, executemany в остальных СУБД). В памяти хранятся только эти словари и текущий пакет.
+
+    Назначение ID зависит только от файла и начальных ID, поэтому при возобновлении (resume) уже загруженная
+    часть файла просматривается без записи, чтобы восстановить словари. Диапазоны ID пакета сохраняются
+    в контрольной точке до его commit (checkpoint с pending), поэтому после сбоя можно проверить, был ли
+    пакет зафиксирован, не трогая строки других клиентов (recover_pending).
+    """
+
+    def __init__(self, db: Session, start_ids: Optional[dict] = None):
+        self.db = db
+        if start_ids is None:
+            maxima = db.execute(select(*(select(func.max(model.id)).scalar_subquery()
+                                         for model in ID_MODELS.values()))).one()
+            start_ids = {table: (maximum or 0) + 1 for table, maximum in zip(ID_MODELS, maxima)}
+        self.start_ids = dict(start_ids)
+        self.next_ids = dict(start_ids)
+        self.keys = {"activity": {}, "building": {}, "organization": {}}
+        self.batch = {table: [] for table in MODELS}
+        self.offset = 0  # Число обработанных записей файла
+        self.committed_offset = 0  # Число записей файла, строки которых зафиксированы
+        self.committed_ids = dict(start_ids)  # next_ids на момент последнего commit
+        self.rows = 0  # Число строк таблиц, записанных в базу данных
+        self.activities = False  # Загружались ли виды деятельности (нужен пересчет таблицы замыкания)
+        self.replaying = False  # Просмотр уже загруженной части файла: ID назначаются, строки не копятся
+        self._copy = db.get_bind().dialect.driver == "psycopg2"
+        self._postgresql = db.get_bind().dialect.name == "postgresql"
+
+    def _allocate(self, table: str) -> int:
+        allocated = self.next_ids[table]
+        self.next_ids[table] += 1
+        return allocated
+
+    def _append(self, table: str, row: dict):
+        if not self.replaying:
+            self.batch[table].append(row)
+
+    def _register(self, kind: str, record: dict, allocated: int):
+        key = record.get("key")
+        if key is not None:
+            self.keys[kind][str(key)] = allocated
+
+    def _resolve(self, kind: str, key) -> int:
+        try:
+            return self.keys[kind][str(key)]
+        except KeyError:
+            raise ValueError(f"Unknown {kind} key: {key}")
+
+    def _check_key(self, kind: str, record: dict):
+        key = record.get("key")
+        if key is not None and str(key) in self.keys[kind]:
+            raise ValueError(f"Duplicate {kind} key: {key}")
+
+    def _add_activity(self, record: dict):
+        self._check_key("activity", record)
+        parent = record.get("parent")
+        parent_id = None if parent is None else self._resolve("activity", parent)
+        activity = _validate(schemas.ActivityCreate, name=record.get("name"), parent_id=parent_id)
+        activity_id = self._allocate("activities")
+        self._append("activities", {"id": activity_id, **activity.model_dump()})
+        self._register("activity", record, activity_id)
+        self.activities = True
+
+    def _add_building(self, record: dict):
+        self._check_key("building", record)
+        building = _validate(schemas.BuildingCreate, address=record.get("address"), latitude=record.get("latitude"),
+                             longitude=record.get("longitude"))
+        building_id = self._allocate("buildings")
+        self._append("buildings", {"id": building_id, **building.model_dump()})
+        self._register("building", record, building_id)
+
+    def _add_organization(self, record: dict):
+        self._check_key("organization", record)
+        organization = _validate(schemas.OrganizationCreate, name=record.get("name"),
+                                 building_id=self._resolve("building", record.get("building")),
+                                 phones=[{"phone_number": phone} for phone in record.get("phones", [])],
+                                 activities=[self._resolve("activity", key) for key in record.get("activities", [])])
+        organization_id = self._allocate("organizations")
+        self._append("organizations",
+                     {"id": organization_id, "name": organization.name, "building_id": organization.building_id})
+        for phone in organization.phones:
+            self._append("organization_phones", {"id": self._allocate("organization_phones"),
+                                                 "organization_id": organization_id,
+                                                 "phone_number": phone.phone_number})
+        for activity_id in dict.fromkeys(organization.activities):
+            self._append("organization_activities", {"organization_id": organization_id, "activity_id": activity_id})
+        self._register("organization", record, organization_id)
+
+    def _add_phone(self, record: dict):
+        organization_id = self._resolve("organization", record.get("organization"))
+        phone = _validate(schemas.OrganizationPhoneCreate, phone_number=record.get("phone_number"))
+        self._append("organization_phones", {"id": self._allocate("organization_phones"),
+                                             "organization_id": organization_id, "phone_number": phone.phone_number})
+
+    def add(self, record) -> Optional[str]:
+        """
+        Добавляет запись (словарь или строку JSON) в текущий пакет по ее полю type
+        (activity, building, organization, phone). Возвращает текст ошибки, если запись пропущена.
+        """
+        self.offset += 1
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError("Record must be an object")
+            handler = getattr(self, f"_add_{record.get('type')}", None)
+            if handler is None:
+                raise ValueError(f"Unknown record type: {record.get('type')}")
+            handler(record)
+        except ValueError as error:  # В том числе json.JSONDecodeError
+            return str(error)
+        return None
+
+    def _write(self, table: str, rows: list):
+        """Записывает строки таблицы: COPY для psycopg2, иначе executemany."""
+        if not self._copy:
+            self.db.execute(insert(MODELS[table]), rows)
+            return
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+        buffer.seek(0)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    def _mark_committed(self, written: bool = True):
+        for rows in self.batch.values():
+            if written:
+                self.rows += len(rows)
+            rows.clear()
+        self.committed_offset = self.offset
+        self.committed_ids = dict(self.next_ids)
+
+    def flush(self):
+        """
+        Записывает текущий пакет и фиксирует его одной транзакцией.
+
+        В PostgreSQL в той же транзакции последовательности ID сдвигаются за записанные строки, чтобы вставки
+        приложения не конфликтовали с ними, даже если загрузка прервется до finish().
+        """
+        for table in MODELS:
+            rows = self.batch[table]
+            if rows:
+                self._write(table, rows)
+                if self._postgresql and table in ID_MODELS:
+                    self.db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                         f"(SELECT coalesce(max(id), 1) FROM {table}))"))
+        self.db.commit()
+        self._mark_committed()
+
+    def recover_pending(self):
+        """
+        Завершает пакет, прерванный после сохранения контрольной точки с pending: пакет уже заново собран
+        из файла, его ID — от committed_ids до next_ids.
+
+        Если строк с этими ID нет, пакет не был зафиксирован и записывается сейчас; если они совпадают
+        со строками пакета, он был зафиксирован до сбоя. Иначе эти ID заняты строками других клиентов —
+        возобновлять загрузку нельзя (RuntimeError), строки базы данных не удаляются.
+        """
+        states = set()
+        for table, model in ID_MODELS.items():
+            rows = self.batch[table]
+            if not rows:
+                continue
+            columns = [model.__table__.c[column] for column in rows[0]]
+            stored = self.db.execute(select(*columns).where(
+                model.id >= self.committed_ids[table], model.id < self.next_ids[table]).order_by(model.id)).all()
+            if not stored:
+                states.add("absent")
+            elif [tuple(row) for row in stored] == [tuple(row.values()) for row in rows]:
+                states.add("committed")
+            else:
+                states.add("foreign")
+        if states == {"committed"}:
+            self._mark_committed(written=False)
+        elif states <= {"absent"}:
+            self.flush()
+        else:
+            raise RuntimeError("IDs of the interrupted batch are taken by rows of other clients")
+
+    def finish(self):
+        """Пересчитывает таблицу замыкания активностей."""
+        if self.activities:
+            crud.rebuild_activity_closure(self.db)
+
+    def checkpoint(self, done: bool = False) -> dict:
+        """
+        Состояние для возобновления загрузки после последнего зафиксированного пакета (done — файл загружен).
+
+        Если текущий пакет еще не зафиксирован, в pending сохраняются его конец в файле и ID (next_ids).
+        """
+        pending = None
+        if self.offset != self.committed_offset:
+            pending = {"offset": self.offset, "next_ids": dict(self.next_ids)}
+        return {"offset": self.committed_offset, "start_ids": self.start_ids, "next_ids": self.committed_ids,
+                "pending": pending, "done": done}
+
+
+def _save_checkpoint(path: str, state: dict):
+    """Атомарно сохраняет контрольную точку (через временный файл)."""
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def run_import(db: Session, path: str, file_format: str = "ndjson", batch_size: int = 10000,
+               checkpoint_path: Optional[str] = None, resume: bool = False,
+               progress: Optional[Callable[[Importer, float], None]] = None,
+               on_error: Optional[Callable[[int, str], None]] = None) -> Importer:
+    """
+    Загружает файл в базу данных пакетами по batch_size записей.
+
+    Контрольная точка checkpoint_path сохраняется до commit каждого пакета (с его ID в pending) и после него,
+    затем вызывается progress(importer, elapsed). При resume=True загрузка продолжается с записи из контрольной
+    точки: предшествующие записи просматриваются без записи в базу данных, а прерванный пакет из pending
+    собирается заново и проверяется по ID (Importer.recover_pending). Загрузчик назначает ID сам, поэтому
+    во время загрузки в эти таблицы не должны писать другие клиенты. on_error(номер записи с 0, текст)
+    вызывается для пропущенных записей.
+    """
+    state = None
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as file:
+            state = json.load(file)
+    importer = Importer(db, state["start_ids"] if state else None)
+    if state and state.get("done"):
+        return importer  # Файл уже загружен целиком
+    records = read_records(path, file_format)
+    if state:
+        importer.replaying = True
+        for record in itertools.islice(records, state["offset"]):
+            importer.add(record)
+        if importer.offset != state["offset"] or importer.next_ids != state["next_ids"]:
+            raise RuntimeError("Checkpoint does not match the file")
+        importer.replaying = False
+        importer.committed_offset, importer.committed_ids = importer.offset, dict(importer.next_ids)
+        pending = state.get("pending")
+        if pending:
+            for record in itertools.islice(records, pending["offset"] - importer.offset):
+                importer.add(record)  # Ошибки этих записей уже переданы on_error до сбоя
+            if importer.offset != pending["offset"] or importer.next_ids != pending["next_ids"]:
+                raise RuntimeError("Checkpoint does not match the file")
+            importer.recover_pending()
+            if checkpoint_path:
+                _save_checkpoint(checkpoint_path, importer.checkpoint())
+
+    def flush():
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, importer.checkpoint())  # ID пакета — до commit
+        importer.flush()
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, importer.checkpoint())
+
+    started = time.perf_counter()
+    for record in records:
+        error = importer.add(record)
+        if error is not None and on_error is not None:
+            on_error(importer.offset - 1, error)
+        if importer.offset % batch_size == 0:
+            flush()
+            if progress is not None:
+                progress(importer, time.perf_counter() - started)
+    flush()
+    importer.finish()
+    if checkpoint_path:
+        _save_checkpoint(checkpoint_path, importer.checkpoint(done=True))
+    if progress is not None:
+        progress(importer, time.perf_counter() - started)
+    return importer
@@ -1,7 +1,12 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import organizations, buildings, activities  # Относительный импорт
+from .routers import organizations, buildings, activities, diagnostics, suggestions  # Относительный импорт
+from .database import SessionLocal
+from . import geo_index, activity_tree, suggest_index
+from .response_cache import response_cache, init_response_cache
+from .pagination import NEXT_CURSOR_HEADER
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO,
@@ -9,6 +14,24 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Жизненный цикл приложения: строит in-memory индексы и включает кэш ответов при старте.
+    """
+    db = SessionLocal()
+    try:
+        geo_index.init_index(db)
+        activity_tree.init_cache(db)
+        suggest_index.init_index(db)
+    finally:
+        db.close()
+    init_response_cache()
+    yield
+    if response_cache.enabled:
+        response_cache.disable()
+
+
 #  Создаем экземпляр FastAPI *внутри* функции
 def create_app():
     """
@@ -21,6 +44,7 @@ def create_app():
         title="Organization API",
         description="API for managing organizations, buildings, and activities",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     # Добавляем middleware для логирования запросов
@@ -35,9 +59,11 @@ def create_app():
         return response
 
     # Добавляем роутеры (передаем app)
+    app.include_router(suggestions.router)  # До organizations: /organizations/suggest раньше /{organization_id}
     app.include_router(organizations.router)
     app.include_router(buildings.router)
     app.include_router(activities.router)
+    app.include_router(diagnostics.router)
 
     # Настройка CORS
     origins = ["*"]  # Разрешаем запросы от любых источников
@@ -48,6 +74,8 @@ def create_app():
         allow_credentials=True,
         allow_methods=["*"],  # Разрешаем все методы
         allow_headers=["*"],  # Разрешаем все заголовки
+        # Курсор, ETag и признак ответа из кэша доступны из браузера
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag", "X-Cache"],
     )
 
     @app.get("/")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, REAL
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, REAL, Index, event, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -9,7 +9,7 @@ class Activity(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
-    parent_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("activities.id"), nullable=True, index=True)
     # Связь "один-ко-многим" (родитель-потомки) для иерархии активностей.
     parent = relationship("Activity", remote_side=[id], backref="children")
     # Связь "многие-ко-многим" с организациями через промежуточную таблицу.
@@ -20,6 +20,21 @@ class Activity(Base):
         return f"<Activity(id={self.id}, name={self.name}, parent_id={self.parent_id})>"
 
 
+class ActivityClosure(Base):
+    """Таблица замыкания иерархии активностей: все пары (предок, потомок) с глубиной вложенности."""
+    __tablename__ = "activity_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("activities.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("activities.id"), primary_key=True, index=True)
+    # Расстояние от предка до потомка (0 — сама активность).
+    depth = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        """Строковое представление объекта."""
+        return (f"<ActivityClosure(ancestor_id={self.ancestor_id}, descendant_id={self.descendant_id}, "
+                f"depth={self.depth})>")
+
+
 class Building(Base):
     """Модель здания."""
     __tablename__ = "buildings"
@@ -31,6 +46,9 @@ class Building(Base):
     # Связь "один-ко-многим" с организациями (здание может содержать несколько организаций).
     organizations = relationship("Organization", back_populates="building")
 
+    # Составной индекс для отбора зданий по прямоугольнику координат.
+    __table_args__ = (Index("ix_buildings_latitude_longitude", "latitude", "longitude"),)
+
     def __repr__(self):
         """Строковое представление объекта."""
         return f"<Building(id={self.id}, address={self.address}, latitude={self.latitude}, longitude={self.longitude})>"
@@ -42,7 +60,7 @@ class Organization(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
-    building_id = Column(Integer, ForeignKey("buildings.id"), nullable=False)
+    building_id = Column(Integer, ForeignKey("buildings.id"), nullable=False, index=True)
     # Связь "многие-к-одному" со зданием (организация находится в одном здании).
     building = relationship("Building", back_populates="organizations")
     # Связь "один-ко-многим" с телефонами (организация может иметь несколько телефонов).
@@ -60,7 +78,7 @@ class OrganizationPhone(Base):
     __tablename__ = "organization_phones"
 
     id = Column(Integer, primary_key=True, index=True)
-    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False, index=True)
     phone_number = Column(String(255), nullable=False)
     # Связь "многие-к-одному" с организацией (телефон принадлежит одной организации).
     organization = relationship("Organization", back_populates="phones")
@@ -77,6 +95,60 @@ class OrganizationActivity(Base):
     organization_id = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
     activity_id = Column(Integer, ForeignKey("activities.id"), primary_key=True)
 
+    # Первичный ключ (organization_id, activity_id) обслуживает поиск по организации, этот индекс —
+    # поиск организаций по активности (покрывающий: организация берется из индекса без чтения таблицы).
+    __table_args__ = (Index("ix_organization_activities_activity_id", "activity_id", "organization_id"),)
+
     def __repr__(self):
         """Строковое представление объекта."""
         return f"<OrganizationActivity(organization_id={self.organization_id}, activity_id={self.activity_id})>"
+
+
+# Таблицы, изменения которых учитываются в table_versions.
+VERSIONED_TABLES = ("activities", "buildings", "organizations", "organization_phones", "organization_activities")
+
+
+class TableVersion(Base):
+    """
+    Счетчик изменений таблицы (версия для ETag ответов, см. crud.get_table_versions).
+
+    Увеличивается триггерами базы данных при любой записи в таблицу (вставка, изменение, удаление),
+    поэтому учитывает изменения из всех процессов, в том числе import_data.py и прямые SQL-запросы.
+    Триггеры создаются миграцией, а для баз, созданных через Base.metadata.create_all, — create_version_triggers.
+    """
+    __tablename__ = "table_versions"
+
+    name = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        """Строковое представление объекта."""
+        return f"<TableVersion(name={self.name}, version={self.version})>"
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_version_triggers(target, connection, **kw):
+    """
+    Создает строки table_versions и триггеры, увеличивающие их (как миграция 4b8e2f7c1d90).
+
+    Только для таблиц, созданных этим вызовом create_all: повторный create_all существующей схемы ничего не меняет.
+    """
+    dialect = connection.dialect.name
+    created = {table.name for table in kw.get("tables", ())}
+    if "table_versions" not in created:
+        return
+    if dialect == "postgresql":
+        connection.execute(text(
+            "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+            "UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME; RETURN NULL; END $$"))
+    for table in VERSIONED_TABLES:
+        connection.execute(text("INSERT INTO table_versions (name, version) VALUES (:name, 0)"), {"name": table})
+        if dialect == "postgresql":
+            connection.execute(text(
+                f"CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"))
+        elif dialect == "sqlite":
+            for operation in ("INSERT", "UPDATE", "DELETE"):
+                connection.execute(text(
+                    f"CREATE TRIGGER {table}_version_{operation.lower()} AFTER {operation} ON {table} BEGIN "
+                    f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"))
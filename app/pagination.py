@@ -0,0 +1,51 @@
+import base64
+import json
+from typing import Callable, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+
+# Заголовок ответа с курсором следующей страницы.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Кодирует значения ключа сортировки последней записи в непрозрачный курсор (base64url от JSON)."""
+    payload = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], *types) -> Optional[tuple]:
+    """
+    Декодирует курсор, проверяя, что он состоит из значений указанных типов (например, int или float, int).
+
+    Возвращает None, если курсор не передан; при некорректном курсоре возвращает ошибку 400.
+    """
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def item_field(item, name: str):
+    """Значение поля записи: ORM-объекта или словаря."""
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def item_id(item) -> int:
+    """ID записи: ORM-объекта или словаря."""
+    return item_field(item, "id")
+
+
+def set_next_cursor(response: Response, items: Sequence, limit: int, key: Callable = lambda item: (item_id(item),)):
+    """
+    Добавляет в ответ заголовок X-Next-Cursor, если страница заполнена целиком (дальше могут быть записи).
+
+    key возвращает кортеж значений ключа сортировки записи; по умолчанию — (id,).
+    """
+    if limit > 0 and len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(items[-1]))
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+from . import events
+
+try:
+    import redis
+except ImportError:  # redis нужен только для RESPONSE_CACHE=redis
+    redis = None
+
+# Кэш ответов GET-эндпоинтов: "memory" (LRU в памяти процесса), "redis" или пустое значение — кэш отключен.
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "")
+# Время жизни записи в секундах.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Максимальное число записей в кэше памяти процесса.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Адрес Redis (или совместимого сервера) для RESPONSE_CACHE=redis.
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Типы сущностей, при создании которых кэшированные ответы устаревают.
+ENTITIES = ("organizations", "buildings", "activities")
+# Заголовки ответа, которые сохраняются вместе с телом.
+CACHED_HEADERS = ("content-type", "x-next-cursor", "etag")
+
+
+def request_identity(request) -> list:
+    """Нормализованное представление запроса: путь, отсортированные параметры и хэш API ключа."""
+    query = sorted(request.query_params.multi_items())
+    credential = hashlib.sha256((request.headers.get("x-api-key") or "").encode()).hexdigest()[:16]
+    return [request.url.path.rstrip("/") or "/", query, credential]
+
+
+class CachedResponse:
+    """Сохраненный ответ: код, тело и заголовки."""
+    __slots__ = ("status_code", "body", "headers")
+
+    def __init__(self, status_code: int, body: bytes, headers: dict):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+
+    def dumps(self) -> bytes:
+        """Сериализует ответ в байты (для внешнего хранилища)."""
+        meta = json.dumps({"status_code": self.status_code, "headers": self.headers}).encode()
+        return meta + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes):
+        """Восстанавливает ответ из байтов, полученных dumps()."""
+        meta, body = data.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(meta["status_code"], body, meta["headers"])
+
+
+class MemoryBackend:
+    """
+    LRU-кэш с TTL в памяти процесса.
+
+    Поколения сущностей тоже хранятся в процессе, поэтому изменения, сделанные другими процессами,
+    видны только после истечения TTL.
+    """
+    blocking = False  # Операции не блокируют цикл событий
+
+    def __init__(self, size: int = 1024, ttl: float = 60):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {ключ: (время истечения, CachedResponse)}
+        self._generations = dict.fromkeys(ENTITIES, 0)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, response = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: CachedResponse):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def generations(self, entities) -> list:
+        with self._lock:
+            return [self._generations.get(entity, 0) for entity in entities]
+
+    def bump(self, entity: str):
+        with self._lock:
+            self._generations[entity] = self._generations.get(entity, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Кэш в Redis (или совместимом сервере), общий для всех процессов приложения.
+
+    Поколения сущностей хранятся в Redis (INCR), поэтому создание записи в одном процессе
+    делает устаревшими ответы во всех процессах.
+    """
+    blocking = True  # Сетевые вызовы выполняются в пуле потоков
+    prefix = "response_cache:"
+
+    def __init__(self, url: str, ttl: float = 60):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE=redis requires the redis package (poetry install --extras redis)")
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        data = self._client.get(self.prefix + key)
+        return CachedResponse.loads(data) if data is not None else None
+
+    def set(self, key: str, response: CachedResponse):
+        self._client.set(self.prefix + key, response.dumps(), px=int(self.ttl * 1000))
+
+    def generations(self, entities) -> list:
+        values = self._client.mget([f"{self.prefix}generation:{entity}" for entity in entities])
+        return [int(value or 0) for value in values]
+
+    def bump(self, entity: str):
+        self._client.incr(f"{self.prefix}generation:{entity}")
+
+
+class ResponseCache:
+    """
+    Кэш ответов GET-эндпоинтов.
+
+    Ключ строится по нормализованному пути, отсортированным параметрам запроса, API ключу и поколениям
+    сущностей, от которых зависит ответ. Создание сущности через crud (события из app/events.py) увеличивает
+    ее поколение, и все ответы, зависящие от нее, перестают находиться в кэше.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._callbacks = {entity: (lambda objects, entity=entity: self.invalidate(entity)) for entity in ENTITIES}
+
+    @property
+    def enabled(self) -> bool:
+        """True, если кэш включен."""
+        return self.backend is not None
+
+    def enable(self, backend):
+        """Включает кэш с указанным хранилищем и подписывается на создание сущностей."""
+        self.backend = backend
+        self.hits = self.misses = 0
+        for entity, callback in self._callbacks.items():
+            events.subscribe(entity, callback)
+
+    def disable(self):
+        """Отключает кэш."""
+        for entity, callback in self._callbacks.items():
+            events.unsubscribe(entity, callback)
+        self.backend = None
+
+    def invalidate(self, entity: str):
+        """Делает устаревшими все ответы, зависящие от сущностей типа entity."""
+        self.backend.bump(entity)
+
+    async def _call(self, method, *args):
+        """Вызывает метод хранилища, не блокируя цикл событий сетевыми операциями."""
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def key(self, request, entities) -> str:
+        """Ключ записи для запроса; entities — типы сущностей, от которых зависит ответ."""
+        generations = await self._call(self.backend.generations, entities) if entities else []
+        return json.dumps([*request_identity(request), generations], separators=(",", ":"))
+
+    async def get(self, key: str):
+        """Возвращает сохраненный ответ или None; обновляет счетчики попаданий и промахов."""
+        response = await self._call(self.backend.get, key)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    async def set(self, key: str, status_code: int, body: bytes, headers):
+        """Сохраняет ответ."""
+        saved = {name: headers[name] for name in CACHED_HEADERS if name in headers}
+        await self._call(self.backend.set, key, CachedResponse(status_code, body, saved))
+
+    def statistics(self) -> dict:
+        """Статистика кэша (в формате schemas.CacheStatistics)."""
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.backend) if isinstance(self.backend, MemoryBackend) else None,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def init_response_cache():
+    """Включает кэш ответов при старте приложения, если он задан переменной окружения RESPONSE_CACHE."""
+    if RESPONSE_CACHE == "memory":
+        response_cache.enable(MemoryBackend(size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL))
+    elif RESPONSE_CACHE == "redis":
+        response_cache.enable(RedisBackend(RESPONSE_CACHE_REDIS_URL, ttl=RESPONSE_CACHE_TTL))
+    elif RESPONSE_CACHE:
+        raise ValueError(f"Unknown RESPONSE_CACHE backend: {RESPONSE_CACHE}")
@@ -1,48 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas  # Относительный импорт
-from ..database import get_db  # Относительный импорт
+from fastapi import APIRouter, Depends, Query, Response, status
+from typing import List, Optional
+from .. import crud, schemas, search  # Относительный импорт
+from ..database import get_db, get_read_db, DbSession  # Относительный импорт
 from ..dependencies import api_key_auth  # Относительный импорт
+from ..pagination import decode_cursor
+from ..routing import cached_route, conditional_get
+from .common import run_crud, run_crud_or_404, run_crud_page
+
+# Сущности, от которых зависят ответы роутера (для кэша ответов и ETag).
+ENTITIES = ("activities",)
+
+# Параметр запроса depth: число уровней вложенных дочерних активностей в ответе.
+DEPTH_QUERY = Query(None, ge=0, description="Levels of nested children to return (default ACTIVITY_TREE_DEPTH)")
 
 # Создаем роутер для активностей.
 router = APIRouter(
     prefix="/activities",
     tags=["Activities"],
-    dependencies=[Depends(api_key_auth)]  # Добавляем зависимость для аутентификации
+    # Аутентификация и условные GET-запросы (ETag / If-None-Match)
+    dependencies=[Depends(api_key_auth), Depends(conditional_get(*ENTITIES))],
+    route_class=cached_route(*ENTITIES),  # Кэш ответов GET-запросов
 )
 
 
 @router.get("/", response_model=List[schemas.Activity])
-def read_activities(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_activities(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                          depth: Optional[int] = DEPTH_QUERY, db: DbSession = Depends(get_read_db)):
     """
     Получает список всех активностей с возможностью пагинации.
+
+    Помимо skip/limit поддерживается курсор: значение заголовка X-Next-Cursor передается в параметре cursor.
+    depth ограничивает число уровней вложенных дочерних активностей.
     """
-    activities = crud.get_activities(db, skip=skip, limit=limit)
-    return activities
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Activity], crud.get_activities, skip=skip, limit=limit,
+                               after_id=after and after[0], depth=depth)
 
 
 @router.get("/{activity_id}", response_model=schemas.Activity)
-def read_activity(activity_id: int, db: Session = Depends(get_db)):
+async def read_activity(activity_id: int, response: Response, depth: Optional[int] = DEPTH_QUERY,
+                        db: DbSession = Depends(get_read_db)):
     """
-    Получает информацию об активности по её ID.
+    Получает информацию об активности по её ID с дочерними активностями не глубже depth уровней.
     """
-    db_activity = crud.get_activity(db, activity_id=activity_id)
-    if db_activity is None:
-        raise HTTPException(status_code=404, detail="Activity not found")
-    return db_activity
+    return await run_crud_or_404(db, response, schemas.Activity, crud.get_activity, activity_id=activity_id,
+                                 depth=depth, not_found="Activity not found")
 
 
 @router.post("/", response_model=schemas.Activity, status_code=status.HTTP_201_CREATED)
-def create_activity(activity: schemas.ActivityCreate, db: Session = Depends(get_db)):
+async def create_activity(activity: schemas.ActivityCreate, response: Response, db: DbSession = Depends(get_db)):
     """
     Создает новую активность.
     """
-    return crud.create_activity(db=db, activity=activity)
+    return await run_crud(db, response, schemas.Activity, crud.create_activity, activity=activity,
+                          status_code=status.HTTP_201_CREATED)
 
 
 @router.get("/by_name/{name}", response_model=List[schemas.Activity])
-def read_activity_by_name(name: str, db: Session = Depends(get_db)):
-    """Получает активности, имя которых содержит заданную подстроку."""
-    activity = crud.get_activity_by_name(db, name)
-    return activity
+async def read_activity_by_name(name: str, response: Response, skip: int = Query(0, ge=0),
+                                limit: int = Query(search.SEARCH_LIMIT, ge=1, le=search.SEARCH_MAX_LIMIT),
+                                depth: Optional[int] = DEPTH_QUERY, db: DbSession = Depends(get_read_db)):
+    """
+    Ищет активности, имя которых содержит заданную подстроку.
+
+    Результаты упорядочены по релевантности (точное совпадение, совпадение с начала имени, остальные)
+    и ограничены skip/limit (по умолчанию SEARCH_LIMIT записей).
+    """
+    return await run_crud(db, response, List[schemas.Activity], crud.get_activity_by_name, name, skip=skip,
+                          limit=limit, depth=depth)
@@ -1,41 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Response, status
+from typing import List, Optional
 from .. import crud, schemas  # Относительный импорт
-from ..database import get_db  # Относительный импорт
+from ..database import get_db, get_read_db, DbSession  # Относительный импорт
 from ..dependencies import api_key_auth  # Относительный импорт
+from ..pagination import decode_cursor
+from ..routing import cached_route, conditional_get
+from ..serialization import FIELDS_QUERY, parse_fields
+from .common import run_crud, run_crud_or_404, run_crud_page
+
+# Сущности, от которых зависят ответы роутера (для кэша ответов и ETag).
+ENTITIES = ("buildings",)
 
 # Создаем роутер для зданий.
 router = APIRouter(
     prefix="/buildings",
     tags=["Buildings"],
-    dependencies=[Depends(api_key_auth)]  # Добавляем зависимость для аутентификации
+    # Аутентификация и условные GET-запросы (ETag / If-None-Match)
+    dependencies=[Depends(api_key_auth), Depends(conditional_get(*ENTITIES))],
+    route_class=cached_route(*ENTITIES),  # Кэш ответов GET-запросов
 )
 
 
 @router.get("/", response_model=List[schemas.Building])
-def read_buildings(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_buildings(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                         fields: Optional[str] = FIELDS_QUERY, db: DbSession = Depends(get_read_db)):
     """
-    Получает список всех зданий с возможностью пагинации.
+    Получает список всех зданий с возможностью пагинации (skip/limit или курсор из заголовка X-Next-Cursor).
     """
-    buildings = crud.get_buildings(db, skip=skip, limit=limit)
-    return buildings
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Building], crud.get_buildings, skip=skip, limit=limit,
+                               after_id=after and after[0], fields=parse_fields(schemas.Building, fields))
 
 
 @router.get("/{building_id}", response_model=schemas.Building)
-def read_building(building_id: int, db: Session = Depends(get_db)):
+async def read_building(building_id: int, response: Response, fields: Optional[str] = FIELDS_QUERY,
+                        db: DbSession = Depends(get_read_db)):
     """
     Получает информацию о здании по его ID.
     """
-    db_building = crud.get_building(db, building_id=building_id)
-    if db_building is None:
-        raise HTTPException(status_code=404, detail="Building not found")
-    return db_building
+    return await run_crud_or_404(db, response, schemas.Building, crud.get_building, building_id=building_id,
+                                 not_found="Building not found", fields=parse_fields(schemas.Building, fields))
 
 
 @router.post("/", response_model=schemas.Building, status_code=status.HTTP_201_CREATED)
-def create_building(building: schemas.BuildingCreate, db: Session = Depends(get_db)):
+async def create_building(building: schemas.BuildingCreate, response: Response, db: DbSession = Depends(get_db)):
     """
     Создает новое здание.
     """
-    return crud.create_building(db=db, building=building)
+    return await run_crud(db, response, schemas.Building, crud.create_building, building=building,
+                          status_code=status.HTTP_201_CREATED)
@@ -0,0 +1,79 @@
+from functools import lru_cache
+
+from fastapi import HTTPException, Response
+from pydantic import TypeAdapter
+
+from .. import serialization
+from ..database import run_db
+from ..pagination import set_next_cursor
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema):
+    """TypeAdapter для схемы ответа (создается один раз на схему)."""
+    return TypeAdapter(schema)
+
+
+def to_response(schema, result, response: Response, status_code: int = 200, fields=None):
+    """
+    Преобразует результат crud (ORM-объекты или словари) в ответ.
+
+    При RESPONSE_SERIALIZATION=fast или запросе части полей (fields — дерево из serialization.parse_fields)
+    результат сразу кодируется в JSON по полям схемы (без повторной валидации pydantic и response_model),
+    а заголовки, выставленные зависимостями и обработчиком (ETag, X-Next-Cursor), переносятся в итоговый ответ.
+    Иначе возвращается провалидированная схема, которую сериализует FastAPI.
+    """
+    if serialization.RESPONSE_SERIALIZATION != "fast" and fields is None:
+        return _adapter(schema).validate_python(result, from_attributes=True)
+    return Response(serialization.dumps(serialization.dump(schema, result, fields)), status_code=status_code,
+                    headers=dict(response.headers), media_type="application/json")
+
+
+def _with_fields(kwargs: dict, fields) -> dict:
+    """Передает дерево полей в функцию crud, только если клиент запросил часть полей."""
+    return kwargs if fields is None else {**kwargs, "fields": fields}
+
+
+async def run_crud_or_404(db, response: Response, schema, fn, *args, not_found: str = "Not found", fields=None,
+                          **kwargs):
+    """
+    Выполняет fn(session, *args, **kwargs) и преобразует результат в ответ внутри работы с сессией.
+
+    Преобразование выполняется там же, где и запрос, поэтому ленивые загрузки связей не выходят за пределы
+    сессии (это обязательно для AsyncSession). Если результат None, возвращает ошибку 404 с текстом not_found.
+    fields — дерево запрошенных полей: передается в crud (для сужения запроса) и ограничивает ответ.
+    """
+
+    def load(session):
+        result = fn(session, *args, **_with_fields(kwargs, fields))
+        return None if result is None else to_response(schema, result, response, fields=fields)
+
+    item = await run_db(db, load)
+    if item is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return item
+
+
+async def run_crud(db, response: Response, schema, fn, *args, status_code: int = 200, fields=None, **kwargs):
+    """Выполняет fn(session, *args, **kwargs) и преобразует результат в ответ внутри работы с сессией."""
+    return await run_db(db, lambda session: to_response(schema, fn(session, *args, **_with_fields(kwargs, fields)),
+                                                        response, status_code, fields))
+
+
+async def run_crud_page(db, response: Response, schema, fn, *args, limit: int, cursor_key=None, fields=None,
+                        **kwargs):
+    """
+    Выполняет списочный запрос crud, добавляет в ответ курсор следующей страницы и преобразует результат в ответ.
+
+    cursor_key — функция ключа сортировки записи для курсора (по умолчанию — ID); fields — дерево полей.
+    """
+
+    def load(session):
+        items = fn(session, *args, limit=limit, **_with_fields(kwargs, fields))
+        if cursor_key is None:
+            set_next_cursor(response, items, limit)
+        else:
+            set_next_cursor(response, items, limit, key=cursor_key)
+        return to_response(schema, items, response, fields=fields)
+
+    return await run_db(db, load)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from typing import List
+from .. import schemas  # Относительный импорт
+from ..database import ENGINES  # Относительный импорт
+from ..db_config import pool_statistics
+from ..dependencies import api_key_auth  # Относительный импорт
+from ..response_cache import response_cache
+from ..routing import single_flight
+
+# Создаем роутер для диагностики.
+router = APIRouter(
+    prefix="/diagnostics",
+    tags=["Diagnostics"],
+    dependencies=[Depends(api_key_auth)]  # Добавляем зависимость для аутентификации
+)
+
+
+@router.get("/pool", response_model=List[schemas.PoolStatistics])
+async def read_pool_statistics():
+    """
+    Получает статистику пулов соединений: выданные соединения, переполнение и время ожидания соединения.
+    """
+    return [pool_statistics(name, engine) for name, engine in ENGINES.items()]
+
+
+@router.get("/cache", response_model=schemas.CacheStatistics)
+async def read_cache_statistics():
+    """
+    Получает статистику кэша ответов: хранилище, число попаданий и промахов,
+    а также число запросов, объединенных с одинаковыми одновременными запросами (single-flight).
+    """
+    return {**response_cache.statistics(), "coalesced": single_flight.coalesced}
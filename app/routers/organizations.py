@@ -1,58 +1,235 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, models  # Относительный импорт
-from ..database import get_db  # Относительный импорт
+import csv
+import io
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional
+from .. import crud, schemas, search, serialization  # Относительный импорт
+from ..database import get_db, get_read_db, run_db, DbSession, ReadSessionLocal  # Относительный импорт
 from ..dependencies import api_key_auth  # Относительный импорт
+from ..pagination import decode_cursor, item_field, item_id
+from ..routing import cached_route, conditional_get
+from ..serialization import FIELDS_QUERY, parse_fields
+from .common import run_crud, run_crud_or_404, run_crud_page, to_response
+
+# Сущности, от которых зависят ответы роутера (для кэша ответов и ETag).
+ENTITIES = ("organizations", "buildings", "activities")
+
+# Форматы выгрузки и их типы содержимого.
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+# Столбцы CSV выгрузки; телефоны и ID видов деятельности перечисляются через «|».
+EXPORT_CSV_COLUMNS = ("id", "name", "building_id", "address", "latitude", "longitude", "phones", "activities")
+# Поля организаций, которые нужны CSV выгрузке (виды деятельности — без дочерних).
+EXPORT_CSV_FIELDS = {"id": None, "name": None, "building": None, "phones": None, "activities": {"id": None}}
 
 # Создаем роутер для организаций.
 router = APIRouter(
     prefix="/organizations",
     tags=["Organizations"],
-    dependencies=[Depends(api_key_auth)]  # Добавляем зависимость для аутентификации
+    # Аутентификация и условные GET-запросы (ETag / If-None-Match)
+    dependencies=[Depends(api_key_auth), Depends(conditional_get(*ENTITIES))],
+    route_class=cached_route(*ENTITIES),  # Кэш ответов GET-запросов
 )
 
 
 @router.get("/", response_model=List[schemas.Organization])
-def read_organizations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_organizations(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                             fields: Optional[str] = FIELDS_QUERY, db: DbSession = Depends(get_read_db)):
     """
     Получает список всех организаций с возможностью пагинации.
+
+    Помимо skip/limit поддерживается курсор: значение заголовка X-Next-Cursor передается в параметре cursor.
+    """
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Organization], crud.get_organizations, skip=skip,
+                               limit=limit, after_id=after and after[0],
+                               fields=parse_fields(schemas.Organization, fields))
+
+
+@router.get("/nearest", response_model=List[schemas.Organization])
+async def read_nearest_organizations(
+        response: Response,
+        latitude: float = Query(..., description="Latitude of the point"),
+        longitude: float = Query(..., description="Longitude of the point"),
+        k: int = Query(10, ge=1, le=100, description="Number of organizations"),
+        activity_ids: Optional[List[int]] = Query(None, description="Only organizations with these activities"),
+        fields: Optional[str] = FIELDS_QUERY,
+        db: DbSession = Depends(get_read_db)
+):
+    """
+    Получает k ближайших к точке организаций, упорядоченных по расстоянию.
+    """
+    return await run_crud(db, response, List[schemas.Organization], crud.get_nearest_organizations, latitude=latitude,
+                          longitude=longitude, k=k, activity_ids=activity_ids,
+                          fields=parse_fields(schemas.Organization, fields))
+
+
+def _csv_line(values) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _export_chunks(file_format: str, fields: Optional[dict]):
+    """
+    Генератор тела выгрузки: по одному блоку байтов на часть организаций из crud.iter_organization_chunks.
+
+    Использует собственную сессию чтения: сессия зависимости закрывается до того, как StreamingResponse
+    начнет читать генератор. Генератор синхронный, поэтому Starlette выполняет его в пуле потоков.
+    """
+    db = ReadSessionLocal()
+    try:
+        if file_format == "csv":
+            yield _csv_line(EXPORT_CSV_COLUMNS)
+            for organizations in crud.iter_organization_chunks(db, EXPORT_CSV_FIELDS):
+                yield b"".join(_csv_line((
+                    organization["id"], organization["name"], organization["building"]["id"],
+                    organization["building"]["address"], organization["building"]["latitude"],
+                    organization["building"]["longitude"],
+                    "|".join(phone["phone_number"] for phone in organization["phones"]),
+                    "|".join(str(activity["id"]) for activity in organization["activities"]),
+                )) for organization in organizations)
+        else:
+            for organizations in crud.iter_organization_chunks(db, fields):
+                yield b"".join(serialization.dumps(serialization.dump(schemas.Organization, organization, fields))
+                               + b"\n" for organization in organizations)
+    finally:
+        db.close()
+
+
+@router.get("/export", response_class=StreamingResponse,
+            responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}})
+async def export_organizations(response: Response,
+                               format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+                               fields: Optional[str] = FIELDS_QUERY):
     """
-    organizations = crud.get_organizations(db, skip=skip, limit=limit)
-    return organizations
+    Выгружает все организации потоком: NDJSON (по объекту schemas.Organization на строку) или CSV.
+
+    Организации читаются серверным курсором частями по EXPORT_CHUNK_SIZE и отправляются клиенту по мере
+    чтения, поэтому память не зависит от размера каталога. Параметр fields поддерживается только для NDJSON.
+    """
+    tree = parse_fields(schemas.Organization, fields)
+    if format == "csv" and tree is not None:
+        raise HTTPException(status_code=400, detail="fields is supported only for NDJSON export")
+    return StreamingResponse(_export_chunks(format, tree), media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={**dict(response.headers),
+                                      "Content-Disposition": f'attachment; filename="organizations.{format}"'})
 
 
 @router.get("/{organization_id}", response_model=schemas.Organization)
-def read_organization(organization_id: int, db: Session = Depends(get_db)):
+async def read_organization(organization_id: int, response: Response, fields: Optional[str] = FIELDS_QUERY,
+                            db: DbSession = Depends(get_read_db)):
     """
     Получает информацию об организации по её ID.
     """
-    db_organization = crud.get_organization(db, organization_id=organization_id)
-    if db_organization is None:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return db_organization
+    return await run_crud_or_404(db, response, schemas.Organization, crud.get_organization, organization_id=organization_id,
+                                 not_found="Organization not found",
+                                 fields=parse_fields(schemas.Organization, fields))
 
 
-@router.post("/", response_model=schemas.Organization, status_code=201)
-def create_organization(organization: schemas.OrganizationCreate, db: Session = Depends(get_db)):
+@router.post("/", response_model=schemas.Organization, status_code=status.HTTP_201_CREATED)
+async def create_organization(organization: schemas.OrganizationCreate, response: Response,
+                              db: DbSession = Depends(get_db)):
     """
     Создает новую организацию.
     """
-    return crud.create_organization(db=db, organization=organization)
+    return await run_crud(db, response, schemas.Organization, crud.create_organization, organization=organization,
+                          status_code=status.HTTP_201_CREATED)
+
+
+async def _bulk_records(request: Request):
+    """
+    Читает записи тела запроса массового создания.
+
+    NDJSON (application/x-ndjson) читается потоком по строкам — каждая запись отдается как bytes и разбирается
+    при валидации, пустые строки пропускаются; иначе тело разбирается как JSON-массив.
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip() == "application/x-ndjson":
+        buffer = b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON")
+    for record in records:
+        yield record
+
+
+def _validation_detail(error: ValidationError) -> str:
+    """Текст ошибки валидации записи: «поле: сообщение» через точку с запятой."""
+    return "; ".join(f"{'.'.join(map(str, item['loc'])) or 'record'}: {item['msg']}" for item in error.errors())
+
+
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_organizations_bulk(request: Request, response: Response, db: DbSession = Depends(get_db)):
+    """
+    Массово создает организации из JSON-массива или потока NDJSON (Content-Type: application/x-ndjson).
+
+    Записи проверяются и вставляются пакетами по BULK_BATCH_SIZE; ошибочные записи (невалидные или
+    со ссылками на несуществующие здания и виды деятельности) пропускаются и перечисляются в ответе
+    с номером записи, остальные создаются.
+    """
+    created, errors = 0, []
+    batch, positions = [], []
+
+    async def flush():
+        nonlocal created
+        for position, error in zip(positions, await run_db(db, crud.create_organizations, batch)):
+            if error is None:
+                created += 1
+            else:
+                errors.append({"index": position, "detail": error})
+        batch.clear()
+        positions.clear()
+
+    index = 0
+    async for record in _bulk_records(request):
+        try:
+            if isinstance(record, bytes):
+                batch.append(schemas.OrganizationCreate.model_validate_json(record))
+            else:
+                batch.append(schemas.OrganizationCreate.model_validate(record))
+            positions.append(index)
+        except ValidationError as error:
+            errors.append({"index": index, "detail": _validation_detail(error)})
+        index += 1
+        if len(batch) >= crud.BULK_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    errors.sort(key=lambda error: error["index"])
+    return to_response(schemas.BulkResult, {"created": created, "errors": errors}, response)
 
 
 @router.get("/by_building/{building_id}", response_model=List[schemas.Organization])
-def read_organizations_by_building(building_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_organizations_by_building(building_id: int, response: Response, skip: int = 0, limit: int = 100,
+                                         cursor: Optional[str] = None, fields: Optional[str] = FIELDS_QUERY,
+                                         db: DbSession = Depends(get_read_db)):
     """
-    Получает список организаций, связанных с определенным зданием, с пагинацией.
+    Получает список организаций, связанных с определенным зданием, с пагинацией (skip/limit или cursor).
     """
-    organizations = crud.get_organizations_by_building(db, building_id=building_id, skip=skip, limit=limit)
-    return organizations
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Organization], crud.get_organizations_by_building,
+                               building_id=building_id, skip=skip, limit=limit, after_id=after and after[0],
+                               fields=parse_fields(schemas.Organization, fields))
 
 
 @router.get("/by_activity/{activity_id}", response_model=List[schemas.Organization])
-def read_organizations_by_activity(activity_id: int, recursive: bool = False, skip: int = 0, limit: int = 100,
-                                   db: Session = Depends(get_db)):
+async def read_organizations_by_activity(activity_id: int, response: Response, recursive: bool = False,
+                                         skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                                         fields: Optional[str] = FIELDS_QUERY,
+                                         db: DbSession = Depends(get_read_db)):
     """
     Получает список организаций, связанных с определенной активностью.
 
@@ -61,51 +238,72 @@ def read_organizations_by_activity(activity_id: int, recursive: bool = False, sk
         recursive: Если True, ищет организации, связанные с дочерними активностями (до 3 уровня вложенности).
         skip: Смещение для пагинации.
         limit: Предел для пагинации.
+        cursor: Курсор следующей страницы (заголовок X-Next-Cursor предыдущего ответа).
         db: Сессия базы данных.
     """
-    organizations = crud.get_organizations_by_activity(db, activity_id=activity_id, skip=skip, limit=limit,
-                                                       recursive=recursive)
-    return organizations
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Organization], crud.get_organizations_by_activity,
+                               activity_id=activity_id, skip=skip, limit=limit, recursive=recursive,
+                               after_id=after and after[0], fields=parse_fields(schemas.Organization, fields))
 
 
 @router.get("/within_radius/", response_model=List[schemas.Organization])
-def read_organizations_within_radius(
+async def read_organizations_within_radius(
+        response: Response,
         latitude: float = Query(..., description="Latitude of the center point"),
         longitude: float = Query(..., description="Longitude of the center point"),
         radius: float = Query(..., description="Radius in kilometers"),
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = None,
+        fields: Optional[str] = FIELDS_QUERY,
+        db: DbSession = Depends(get_read_db)
 ):
     """
     Получает список организаций, находящихся в заданном радиусе от указанной точки.
     Используется формула гаверсинусов для расчета расстояния.
 
+    Организации упорядочены по (расстояние, ID); курсор следующей страницы возвращается в заголовке X-Next-Cursor.
     """
-    organizations = crud.get_organizations_within_radius(db, latitude=latitude, longitude=longitude, radius=radius,
-                                                         skip=skip, limit=limit)
-    return organizations
+    after = decode_cursor(cursor, float, int)
+    return await run_crud_page(db, response, List[schemas.Organization], crud.get_organizations_within_radius,
+                               latitude=latitude, longitude=longitude, radius=radius, skip=skip, limit=limit,
+                               after=after,
+                               cursor_key=lambda organization: (item_field(organization, "distance"), item_id(organization)),
+                               fields=parse_fields(schemas.Organization, fields))
 
 
 @router.get("/within_rectangle/", response_model=List[schemas.Organization])
-def read_organizations_within_rectangle(
+async def read_organizations_within_rectangle(
+        response: Response,
         lat_min: float = Query(..., description="Minimum latitude"),
         long_min: float = Query(..., description="Minimum longitude"),
         lat_max: float = Query(..., description="Maximum latitude"),
         long_max: float = Query(..., description="Maximum longitude"),
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = None,
+        fields: Optional[str] = FIELDS_QUERY,
+        db: DbSession = Depends(get_read_db)
 ):
     """
-     Получает список организаций, находящихся в пределах заданного прямоугольника.
+     Получает список организаций, находящихся в пределах заданного прямоугольника (skip/limit или cursor).
     """
-    organizations = crud.get_organizations_within_rectangle(db, lat_min, long_min, lat_max, long_max, skip, limit)
-    return organizations
+    after = decode_cursor(cursor, int)
+    return await run_crud_page(db, response, List[schemas.Organization], crud.get_organizations_within_rectangle,
+                               lat_min, long_min, lat_max, long_max, skip=skip, limit=limit,
+                               after_id=after and after[0], fields=parse_fields(schemas.Organization, fields))
 
 
 @router.get("/by_name/{name}", response_model=List[schemas.Organization])
-def read_organizations_by_name(name: str, db: Session = Depends(get_db)):
-    """Получает организации, имя которых содержит заданную подстроку."""
-    organizations = crud.get_organization_by_name(db, name)
-    return organizations
+async def read_organizations_by_name(name: str, response: Response, skip: int = Query(0, ge=0),
+                                     limit: int = Query(search.SEARCH_LIMIT, ge=1, le=search.SEARCH_MAX_LIMIT),
+                                     fields: Optional[str] = FIELDS_QUERY, db: DbSession = Depends(get_read_db)):
+    """
+    Ищет организации, имя которых содержит заданную подстроку.
+
+    Результаты упорядочены по релевантности (точное совпадение, совпадение с начала имени, остальные)
+    и ограничены skip/limit (по умолчанию SEARCH_LIMIT записей).
+    """
+    return await run_crud(db, response, List[schemas.Organization], crud.get_organization_by_name, name, skip=skip,
+                          limit=limit, fields=parse_fields(schemas.Organization, fields))
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Query, Response
+from typing import List
+from .. import crud, schemas  # Относительный импорт
+from ..database import get_read_db, DbSession  # Относительный импорт
+from ..dependencies import api_key_auth  # Относительный импорт
+from ..suggest_index import suggest_index
+from .common import run_crud, to_response
+
+# Роутер подсказок. Он подключается до роутера организаций, чтобы путь /organizations/suggest не совпадал
+# с /organizations/{organization_id}, и не использует ETag и кэш ответов: ответ из индекса дешевле
+# запроса версий таблиц.
+router = APIRouter(
+    prefix="/organizations",
+    tags=["Organizations"],
+    dependencies=[Depends(api_key_auth)]  # Добавляем зависимость для аутентификации
+)
+
+
+@router.get("/suggest", response_model=List[schemas.Suggestion])
+async def read_suggestions(response: Response, q: str = Query(..., min_length=1, description="Name prefix"),
+                           limit: int = Query(10, ge=1, le=50), db: DbSession = Depends(get_read_db)):
+    """
+    Подсказки для поля поиска: до limit организаций и видов деятельности, имя которых (или слово в имени)
+    начинается с q без учета регистра.
+
+    Ответ формируется из индекса подсказок в памяти процесса без обращения к базе данных, если индекс включен;
+    после истечения его TTL индекс перестраивается в crud.get_suggestions.
+    """
+    if suggest_index.fresh:
+        return to_response(List[schemas.Suggestion], suggest_index.suggest(q, limit), response)
+    return await run_crud(db, response, List[schemas.Suggestion], crud.get_suggestions, q, limit=limit)
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+from . import crud, events
+from .database import get_read_db, run_db
+from .response_cache import ENTITIES, request_identity, response_cache
+
+# Объединение одинаковых одновременных GET-запросов (single-flight): "1" — включено (по умолчанию), "0" — отключено.
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые вычисления: пока вычисление по ключу выполняется,
+    остальные вызовы с тем же ключом ждут его результат (или исключение) вместо повторного запуска.
+    """
+
+    def __init__(self):
+        self.coalesced = 0  # Число вызовов, получивших результат чужого вычисления
+        self._calls = {}  # {ключ: asyncio.Future}
+
+    async def do(self, key, fn):
+        """Выполняет корутинную функцию fn() или присоединяется к уже выполняющемуся вызову с тем же ключом."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await fn()  # Исходный запрос был отменен (например, клиент отключился)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # Исключение получат ожидающие вызовы; помечаем его обработанным
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+single_flight = SingleFlight()
+
+# Счетчики записей этого процесса по типам сущностей: входят в ключ single-flight, чтобы запрос,
+# пришедший после записи, не присоединялся к вычислению, начатому до нее.
+write_generations = dict.fromkeys(ENTITIES, 0)
+
+
+def _on_write(entity: str):
+    write_generations[entity] += 1
+
+
+for _entity in ENTITIES:
+    events.subscribe(_entity, lambda objects, entity=_entity: _on_write(entity))
+
+
+def _copy_response(response: Response) -> Response:
+    """Копия готового ответа для запроса, присоединившегося к чужому вычислению."""
+    return Response(response.body, status_code=response.status_code, headers=dict(response.headers))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Проверяет, совпадает ли ETag с одним из значений заголовка If-None-Match."""
+    if not if_none_match:
+        return False
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value == "*" or value.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def conditional_get(*entities: str):
+    """
+    Возвращает зависимость роутера, поддерживающую условные GET-запросы (ETag / If-None-Match).
+
+    ETag вычисляется по пути, параметрам запроса и версиям таблиц entities (crud.get_table_versions) —
+    одним запросом по индексам, без выборки данных. Если клиент прислал совпадающий If-None-Match,
+    возвращается 304 Not Modified до выполнения обработчика: данные не запрашиваются и не сериализуются.
+    """
+
+    async def check_etag(request: Request, response: Response, db=Depends(get_read_db)):
+        if request.method != "GET":
+            return
+        versions = await run_db(db, crud.get_table_versions, entities)
+        query = sorted(request.query_params.multi_items())
+        digest = hashlib.sha256(json.dumps([request.url.path, query, versions]).encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+    return check_etag
+
+
+def cached_route(*entities: str):
+    """
+    Возвращает класс маршрута (route_class для APIRouter), кэширующий успешные ответы GET-запросов
+    и объединяющий одинаковые одновременные GET-запросы (single-flight).
+
+    entities — типы сущностей, от которых зависят ответы роутера: создание любой из них через crud
+    делает сохраненные ответы устаревшими. Ответ кэша помечается заголовком X-Cache: HIT; если ETag
+    сохраненного ответа совпадает с If-None-Match, возвращается 304 без обращения к базе данных.
+    При промахе одновременные одинаковые запросы выполняют один запрос к базе данных и одну сериализацию.
+    """
+
+    class CachedRoute(APIRoute):
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+
+            async def compute(request: Request, key) -> Response:
+                response = await handler(request)
+                # Кэшируются только успешные ответы с готовым телом (не потоковые).
+                if key is not None:
+                    if response.status_code == 200 and hasattr(response, "body"):
+                        await response_cache.set(key, response.status_code, response.body, response.headers)
+                    response.headers["X-Cache"] = "MISS"
+                return response
+
+            async def cached_handler(request: Request) -> Response:
+                if request.method != "GET":
+                    return await handler(request)
+                key = None
+                if response_cache.enabled:
+                    key = await response_cache.key(request, entities)
+                    cached = await response_cache.get(key)
+                    if cached is not None:
+                        etag = cached.headers.get("etag")
+                        if etag and etag_matches(request.headers.get("if-none-match"), etag):
+                            return Response(status_code=304, headers={"ETag": etag, "X-Cache": "HIT"})
+                        return Response(cached.body, status_code=cached.status_code,
+                                        headers={**cached.headers, "X-Cache": "HIT"})
+                if not SINGLE_FLIGHT:
+                    return await compute(request, key)
+
+                # If-None-Match входит в ключ: от него зависит, будет ли ответ 304. Счетчики записей
+                # и ключ кэша (с поколениями хранилища, общими для процессов при Redis) — чтобы не получить
+                # результат вычисления, начатого до записи, которую клиент уже видел.
+                flight_key = json.dumps([*request_identity(request), request.headers.get("if-none-match"),
+                                         [write_generations[entity] for entity in entities], key])
+                owner = []  # Заполняется, только если вычисление выполняет этот запрос
+
+                async def run():
+                    owner.append(True)
+                    return await compute(request, key)
+
+                response = await single_flight.do(flight_key, run)
+                if owner:
+                    return response
+                if not hasattr(response, "body"):
+                    return await compute(request, key)  # Потоковый ответ нельзя разделить: выполняем свой запрос
+                return _copy_response(response)
+
+            return cached_handler
+
+    return CachedRoute
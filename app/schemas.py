@@ -80,3 +80,45 @@ class Organization(OrganizationBase):
     phones: List[OrganizationPhone]  # Вложенные телефоны
     activities: List[Activity]  # Вложенные активности
     model_config = ConfigDict(from_attributes=True)  # Правильно
+
+
+class BulkError(BaseModel):
+    """Ошибка одной записи массового создания."""
+    index: int  # Номер записи во входных данных (с 0)
+    detail: str
+
+
+class BulkResult(BaseModel):
+    """Итог массового создания: число созданных записей и ошибки отклоненных."""
+    created: int
+    errors: List[BulkError]
+
+
+class Suggestion(BaseModel):
+    """Схема подсказки автодополнения по имени."""
+    id: int
+    name: str
+    type: str  # "organization" или "activity"
+
+
+class PoolStatistics(BaseModel):
+    """Схема статистики пула соединений движка базы данных."""
+    name: str
+    pool_class: str
+    size: Optional[int] = None  # Размер пула (None — пул без ограничения размера)
+    checked_in: Optional[int] = None  # Свободные соединения в пуле
+    checked_out: Optional[int] = None  # Выданные соединения
+    overflow: Optional[int] = None  # Открытые соединения сверх размера пула
+    max_overflow: Optional[int] = None
+    wait_count: int  # Число выдач соединений
+    wait_time_total_ms: float  # Суммарное время получения соединений
+    wait_time_max_ms: float  # Максимальное время получения соединения
+
+
+class CacheStatistics(BaseModel):
+    """Схема статистики кэша ответов."""
+    backend: Optional[str] = None  # Хранилище кэша (None — кэш отключен)
+    hits: int  # Ответы, отданные из кэша
+    misses: int  # Ответы, вычисленные заново
+    size: Optional[int] = None  # Число записей (только для кэша в памяти процесса)
+    coalesced: int = 0  # Запросы, получившие результат одинакового одновременного запроса (single-flight)
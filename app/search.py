@@ -0,0 +1,137 @@
+import os
+import weakref
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, case, event, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Число результатов поиска по имени по умолчанию и максимально допустимое.
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "20"))
+SEARCH_MAX_LIMIT = 100
+
+# Минимальная длина строки для поиска по FTS5 с токенизатором trigram (более короткие ищутся через LIKE).
+FTS_MIN_LENGTH = 3
+
+# Таблицы, имена которых индексируются для поиска.
+SEARCH_TABLES = ("organizations", "activities")
+
+# Индексы FTS5 для SQLite (виртуальные таблицы создаются миграцией, поэтому не входят в Base.metadata).
+fts_metadata = MetaData()
+fts_tables = {
+    table: Table(f"{table}_fts", fts_metadata, Column("rowid", Integer, primary_key=True), Column("name", String))
+    for table in SEARCH_TABLES
+}
+
+# Кэш наличия индексов для каждого движка, чтобы не обращаться к каталогу на каждый запрос.
+_fts_available = weakref.WeakKeyDictionary()
+_trgm_available = weakref.WeakKeyDictionary()
+
+
+@event.listens_for(Engine, "connect")
+def _register_casefold(dbapi_connection, connection_record):
+    """
+    Регистрирует в соединениях SQLite (sqlite3, aiosqlite) функцию casefold(): встроенные lower() и LIKE
+    SQLite не учитывают регистр только для латиницы, поэтому «еда» не совпадает с «Еда».
+    """
+    create_function = getattr(dbapi_connection, "create_function", None)
+    if create_function is not None:
+        create_function("casefold", 1, lambda value: None if value is None else value.casefold(), deterministic=True)
+
+
+def sqlite_fts_statements(table: str):
+    """
+    DDL полнотекстового индекса FTS5 (токенизатор trigram) по полю name таблицы table и триггеров,
+    поддерживающих его в актуальном состоянии. Индекс ищет подстроки без учета регистра, как ILIKE '%...%'.
+    Совпадает с DDL миграции 5e0b7c2d9a41 (миграции не импортируют код приложения).
+    """
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF name ON {table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    ]
+
+
+def drop_sqlite_fts_statements(table: str):
+    """DDL удаления индекса FTS5 и его триггеров (обратное к sqlite_fts_statements)."""
+    fts = f"{table}_fts"
+    return [f"DROP TRIGGER IF EXISTS {fts}_{event}" for event in ("delete", "update", "insert")] + [
+        f"DROP TABLE IF EXISTS {fts}"]
+
+
+def has_fts(db: Session, table: str) -> bool:
+    """Проверяет (с кэшированием), создан ли в SQLite индекс FTS5 для таблицы table."""
+    engine = db.get_bind().engine
+    if engine not in _fts_available:
+        _fts_available[engine] = {name for name in SEARCH_TABLES if inspect(engine).has_table(f"{name}_fts")}
+    return table in _fts_available[engine]
+
+
+def has_trgm(db: Session) -> bool:
+    """Проверяет (с кэшированием), установлено ли в PostgreSQL расширение pg_trgm."""
+    engine = db.get_bind().engine
+    if engine not in _trgm_available:
+        _trgm_available[engine] = db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    return _trgm_available[engine]
+
+
+def escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE (%, _ и символ экранирования \\)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_query(value: str) -> str:
+    """Строка FTS5 MATCH, ищущая value как фразу (без операторов запроса FTS5)."""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def name_prefix(db: Session, model, prefix: str):
+    """
+    Условие поиска записей model по началу имени без учета регистра и выражение имени для сортировки.
+
+    В SQLite сравниваются значения casefold() (см. _register_casefold): LIKE SQLite не учитывает регистр
+    только для латиницы. В остальных СУБД — ILIKE (в PostgreSQL его ускоряет индекс pg_trgm) и lower().
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        folded = func.casefold(model.name)
+        return folded.like(f"{escape_like(prefix.casefold())}%", escape="\\"), folded
+    return model.name.ilike(f"{escape_like(prefix)}%", escape="\\"), func.lower(model.name)
+
+
+def name_search(db: Session, model, name: str):
+    """
+    Условие поиска записей model по подстроке в имени и порядок результатов по релевантности.
+
+    - PostgreSQL: ILIKE, использующий GIN-индекс pg_trgm; результаты упорядочены по similarity().
+    - SQLite: индекс FTS5 с токенизатором trigram (если он создан миграцией и строка не короче трех символов).
+    - Остальные случаи: ILIKE (в SQLite — LIKE по casefold()) с последовательным просмотром таблицы.
+
+    Вне PostgreSQL с pg_trgm порядок такой: точное совпадение, совпадение с начала имени, остальные;
+    внутри группы — более короткие имена, затем по ID. Возвращает (условие, список выражений ORDER BY).
+    В SQLite регистр приводится функцией casefold() (см. _register_casefold) так же, как в Python.
+    """
+    condition = model.name.ilike(f"%{escape_like(name)}%", escape="\\")
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql" and has_trgm(db):
+        return condition, [func.similarity(model.name, name).desc(), model.id]
+
+    folded, value = func.lower(model.name), name.lower()
+    if dialect == "sqlite":
+        folded, value = func.casefold(model.name), name.casefold()
+        condition = folded.like(f"%{escape_like(value)}%", escape="\\")
+
+    table = model.__tablename__
+    if dialect == "sqlite" and len(name) >= FTS_MIN_LENGTH and has_fts(db, table):
+        fts = fts_tables[table]
+        condition = model.id.in_(select(fts.c.rowid).where(fts.c.name.match(_fts_query(name))))
+
+    rank = case((folded == value, 0), (folded.like(f"{escape_like(value)}%", escape="\\"), 1), else_=2)
+    return condition, [rank, func.length(model.name), model.id]
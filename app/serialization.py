@@ -0,0 +1,141 @@
+import json
+import os
+import typing
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+
+# Сериализация ответов: "fast" — ORM-объекты напрямую в JSON по полям схем (по умолчанию),
+# "pydantic" — через валидацию схем и response_model FastAPI.
+RESPONSE_SERIALIZATION = os.getenv("RESPONSE_SERIALIZATION", "fast")
+
+# Параметр запроса fields (частичный ответ) для эндпоинтов чтения.
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return, e.g. id,name,building.latitude")
+
+# Виды полей схемы.
+_VALUE, _FLOAT, _MODEL, _LIST = range(4)
+
+
+def _optional_type(annotation):
+    """Убирает Optional[...] из аннотации поля."""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+@lru_cache(maxsize=None)
+def _plan(schema):
+    """
+    План сериализации схемы: (имя поля, вид, вложенная схема, значение по умолчанию) в порядке полей схемы.
+
+    Порядок полей и приведение float совпадают с сериализацией pydantic, поэтому JSON получается
+    побайтно таким же, как при response_model.
+    """
+    plan = []
+    for name, field in schema.model_fields.items():
+        annotation = _optional_type(field.annotation)
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        if typing.get_origin(annotation) in (list, typing.List) and _is_model(typing.get_args(annotation)[0]):
+            plan.append((name, _LIST, typing.get_args(annotation)[0], default))
+        elif _is_model(annotation):
+            plan.append((name, _MODEL, annotation, default))
+        elif annotation is float:
+            plan.append((name, _FLOAT, None, default))
+        else:
+            plan.append((name, _VALUE, None, default))
+    return tuple(plan)
+
+
+def _item_schema(schema):
+    """Схема элемента для List[схема] или сама схема."""
+    if typing.get_origin(schema) in (list, typing.List):
+        return typing.get_args(schema)[0]
+    return schema
+
+
+def parse_fields(schema, fields: Optional[str]) -> Optional[dict]:
+    """
+    Разбирает параметр fields (например, "id,name,building.latitude") в дерево полей {имя: поддерево или None}.
+
+    None в дереве означает поле целиком (со всеми вложенными полями), а None вместо дерева — все поля схемы.
+    При неизвестном поле возвращает ошибку 400.
+    """
+    if fields is None:
+        return None
+    tree = {}
+    for path in fields.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node, current = tree, _item_schema(schema)
+        parts = path.split(".")
+        for position, part in enumerate(parts):
+            nested = {name: nested for name, _, nested, _ in _plan(current)}
+            if part not in nested or (position < len(parts) - 1 and nested[part] is None):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown field: {path}")
+            if position == len(parts) - 1:
+                node[part] = None
+            elif node.get(part, {}) is None:
+                break  # Поле уже запрошено целиком
+            else:
+                node = node.setdefault(part, {})
+                current = nested[part]
+    if not tree:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty fields")
+    return tree
+
+
+def wants(fields: Optional[dict], name: str) -> bool:
+    """True, если поле name входит в дерево полей (None — все поля)."""
+    return fields is None or name in fields
+
+
+def subfields(fields: Optional[dict], name: str) -> Optional[dict]:
+    """Поддерево полей для вложенного поля name (None — все вложенные поля)."""
+    return None if fields is None else fields.get(name)
+
+
+def _dump_model(schema, obj, fields: Optional[dict] = None) -> dict:
+    """Собирает словарь по полям схемы (или дереву fields) из ORM-объекта или словаря без валидации."""
+    is_dict = isinstance(obj, dict)
+    data = {}
+    for name, kind, nested, default in _plan(schema):
+        if fields is not None and name not in fields:
+            continue
+        value = obj.get(name, default) if is_dict else getattr(obj, name, default)
+        if value is None or kind == _VALUE:
+            data[name] = value
+        elif kind == _LIST:
+            nested_fields = subfields(fields, name)
+            data[name] = [_dump_model(nested, item, nested_fields) for item in value]
+        elif kind == _MODEL:
+            data[name] = _dump_model(nested, value, subfields(fields, name))
+        else:
+            data[name] = float(value)
+    return data
+
+
+def dump(schema, result, fields: Optional[dict] = None):
+    """
+    Преобразует результат crud (ORM-объекты или словари) в JSON-совместимую структуру по схеме ответа.
+
+    schema — схема pydantic или List[схема]; fields — дерево запрошенных полей (parse_fields), None — все поля.
+    Данные считаются доверенными (они получены из базы данных), поэтому ограничения полей не проверяются.
+    """
+    if typing.get_origin(schema) in (list, typing.List):
+        item_schema = typing.get_args(schema)[0]
+        return [_dump_model(item_schema, item, fields) for item in result]
+    return _dump_model(schema, result, fields)
+
+
+def dumps(content) -> bytes:
+    """Кодирует структуру в JSON с теми же параметрами, что и JSONResponse (побайтно одинаковый результат)."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
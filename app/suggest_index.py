@@ -0,0 +1,180 @@
+import bisect
+import os
+import threading
+import time
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from . import events, models
+
+# Индекс подсказок по именам организаций и видов деятельности: "1" — включен (по умолчанию), "0" — подсказки
+# выбираются из базы данных.
+SUGGEST_INDEX = os.getenv("SUGGEST_INDEX", "1")
+# Время жизни индекса в секундах (0 — без ограничения): имена, созданные другими процессами (другими
+# воркерами, import_data.py), появляются в подсказках после перестроения индекса.
+SUGGEST_INDEX_TTL = float(os.getenv("SUGGEST_INDEX_TTL", "300"))
+
+
+def fold(text: str) -> str:
+    """Приводит строку к виду для сравнения без учета регистра (casefold, «ё» как «е»)."""
+    return text.casefold().replace("ё", "е")
+
+
+def _word_starts(folded: str):
+    """Позиции начала слов в имени, кроме первого (с которых имя тоже можно найти по префиксу)."""
+    return [position for position in range(1, len(folded)) if folded[position].isalnum() and
+            not folded[position - 1].isalnum()]
+
+
+def _merge(entries: list, new: list) -> list:
+    """
+    Новый отсортированный список из отсортированных entries и new: позиции вставки ищутся bisect
+    (O(len(new) · log len(entries)) сравнений), а участки entries между ними копируются срезами.
+    """
+    merged, start = [], 0
+    for entry in new:
+        position = bisect.bisect_right(entries, entry, start)
+        merged.extend(entries[start:position])
+        merged.append(entry)
+        start = position
+    merged.extend(entries[start:])
+    return merged
+
+
+class SuggestIndex:
+    """
+    In-memory индекс подсказок (автодополнения) по префиксу имени.
+
+    Хранит два отсортированных массива ключей (fold(имя) с позиции слова, имя, тип, ID): по началу имени
+    и по началу остальных слов. Поиск — bisect по префиксу и просмотр не более limit подходящих записей,
+    поэтому время ответа не зависит от числа имен. Строится при старте приложения и дополняется
+    при создании организаций и видов деятельности через crud (события "organizations" и "activities").
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._names = None  # Ключи по началу имени
+        self._words = None  # Ключи по началу остальных слов имени
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True, если индекс построен."""
+        return self._names is not None
+
+    @property
+    def fresh(self) -> bool:
+        """True, если индекс построен и его TTL не истек: подсказки можно выдать без обращения к базе данных."""
+        return self.ready and not (self.ttl and time.monotonic() - self._loaded_at > self.ttl)
+
+    def __len__(self):
+        return len(self._names) if self._names is not None else 0
+
+    @staticmethod
+    def _entries(name: str, kind: str, item_id: int):
+        """Записи индекса для имени: (ключ по началу имени, [ключи по началу остальных слов])."""
+        folded = fold(name)
+        return (folded, name, kind, item_id), [(folded[position:], name, kind, item_id)
+                                               for position in _word_starts(folded)]
+
+    def load(self, db: Session):
+        """Строит индекс по всем организациям и видам деятельности и подписывается на создание новых."""
+        names, words = [], []
+        for kind, model in (("organization", models.Organization), ("activity", models.Activity)):
+            for item_id, name in db.query(model.id, model.name):
+                entry, word_entries = self._entries(name, kind, item_id)
+                names.append(entry)
+                words.extend(word_entries)
+        names.sort()
+        words.sort()
+        with self._lock:
+            self._names, self._words = names, words
+            self._loaded_at = time.monotonic()
+        events.subscribe("organizations", self._on_organizations_created)
+        events.subscribe("activities", self._on_activities_created)
+
+    def clear(self):
+        """Отключает индекс: подсказки снова выбираются из базы данных."""
+        events.unsubscribe("organizations", self._on_organizations_created)
+        events.unsubscribe("activities", self._on_activities_created)
+        with self._lock:
+            self._names = self._words = None
+
+    def ensure_fresh(self, db: Session) -> bool:
+        """Возвращает True, если индекс можно использовать; перестраивает его, если истек TTL."""
+        if self._names is None:
+            return False
+        if not self.fresh:
+            self.load(db)
+        return True
+
+    def _on_organizations_created(self, organizations: List[models.Organization]):
+        self.add_many([(organization.name, "organization", organization.id) for organization in organizations])
+
+    def _on_activities_created(self, activities: List[models.Activity]):
+        self.add_many([(activity.name, "activity", activity.id) for activity in activities])
+
+    def add(self, name: str, kind: str, item_id: int):
+        """Добавляет имя в индекс."""
+        entry, word_entries = self._entries(name, kind, item_id)
+        with self._lock:
+            if self._names is None:
+                return
+            bisect.insort(self._names, entry)
+            for word_entry in word_entries:
+                bisect.insort(self._words, word_entry)
+
+    def add_many(self, items):
+        """
+        Добавляет в индекс имена items — список (имя, тип, ID).
+
+        Одно имя вставляется bisect.insort; пакет сортируется и сливается с массивами индекса одним проходом
+        (_merge) вместо insort на каждое имя. Массивы заменяются новыми, поэтому suggest() без блокировки
+        видит либо старое, либо новое состояние индекса.
+        """
+        if len(items) == 1:
+            self.add(*items[0])
+            return
+        names, words = [], []
+        for name, kind, item_id in items:
+            entry, word_entries = self._entries(name, kind, item_id)
+            names.append(entry)
+            words.extend(word_entries)
+        names.sort()
+        words.sort()
+        with self._lock:
+            if self._names is None:
+                return
+            self._names, self._words = _merge(self._names, names), _merge(self._words, words)
+
+    def suggest(self, prefix: str, limit: int = 10):
+        """
+        Возвращает до limit подсказок {"id", "name", "type"} для префикса без учета регистра.
+
+        Сначала идут имена, начинающиеся с префикса, затем имена, в которых с него начинается другое слово;
+        внутри группы — по алфавиту.
+        """
+        key = fold(prefix.strip())
+        if not key:
+            return []
+        found, seen = [], set()
+        for entries in (self._names, self._words):
+            position = bisect.bisect_left(entries, (key,))
+            while len(found) < limit and position < len(entries) and entries[position][0].startswith(key):
+                _, name, kind, item_id = entries[position]
+                if (kind, item_id) not in seen:
+                    seen.add((kind, item_id))
+                    found.append({"id": item_id, "name": name, "type": kind})
+                position += 1
+        return found
+
+
+suggest_index = SuggestIndex(ttl=SUGGEST_INDEX_TTL)
+
+
+def init_index(db: Session):
+    """Строит индекс подсказок при старте приложения, если он включен переменной окружения SUGGEST_INDEX."""
+    if SUGGEST_INDEX == "1":
+        suggest_index.load(db)
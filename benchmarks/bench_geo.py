@@ -0,0 +1,93 @@
+"""
+Бенчмарк поиска организаций в радиусе: SQL-выражение против in-memory индексов (kdtree, numpy).
+
+Запуск:
+    python benchmarks/bench_geo.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud, models  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.geo_index import building_index  # noqa: E402
+
+# Центр поиска (Москва) и область, в которой равномерно разбросаны здания.
+CENTER = (55.7558, 37.6176)
+AREA = ((50.0, 60.0), (30.0, 50.0))
+
+
+def populate(session, size: int, seed: int = 42):
+    """Создает size зданий и по одной организации в каждом."""
+    rng = random.Random(seed)
+    (lat_low, lat_high), (long_low, long_high) = AREA
+    batch = 50_000
+    for start in range(0, size, batch):
+        count = min(batch, size - start)
+        session.execute(insert(models.Building), [
+            {"id": start + i + 1, "address": f"Building {start + i + 1}",
+             "latitude": rng.uniform(lat_low, lat_high), "longitude": rng.uniform(long_low, long_high)}
+            for i in range(count)
+        ])
+        session.execute(insert(models.Organization), [
+            {"id": start + i + 1, "name": f"Organization {start + i + 1}", "building_id": start + i + 1}
+            for i in range(count)
+        ])
+    session.commit()
+
+
+def measure(session, radius: float, repeat: int) -> float:
+    """Среднее время (мс) одного вызова crud.get_organizations_within_radius."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        crud.get_organizations_within_radius(session, CENTER[0], CENTER[1], radius, skip=0, limit=100)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def run(size: int, radius: float, repeat: int, backends):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        populate(session, size)
+
+        results = {"sql": measure(session, radius, repeat)}
+        for backend in backends:
+            started = time.perf_counter()
+            building_index.load(session, backend=backend)
+            build_ms = (time.perf_counter() - started) * 1000
+            try:
+                results[backend] = measure(session, radius, repeat)
+                results[f"{backend} build"] = build_ms
+            finally:
+                building_index.clear()
+        session.close()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--radius", type=float, default=10.0, help="Радиус поиска, км")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=["kdtree", "numpy"])
+    args = parser.parse_args()
+
+    print(f"{'buildings':>10} | {'backend':>14} | {'ms':>10}")
+    for size in args.sizes:
+        for name, value in run(size, args.radius, args.repeat, args.backends).items():
+            print(f"{size:>10} | {name:>14} | {value:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
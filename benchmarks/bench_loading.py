@@ -0,0 +1,144 @@
+"""
+Бенчмарк стратегий загрузки организаций: тройной joinedload, selectinload (crud.organization_query)
+и чтение столбцами без ORM-объектов (ORGANIZATION_READS=projection).
+
+Для разного числа телефонов и активностей на организацию показывает, сколько строк возвращает база данных,
+сколько занимает загрузка одной страницы организаций и пиковый объем выделенной при этом памяти.
+
+Запуск:
+    python benchmarks/bench_loading.py --per-organization 1 5 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ACTIVITY_CACHE", "0")
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import joinedload, sessionmaker  # noqa: E402
+
+from app import crud, models  # noqa: E402
+from app.database import Base  # noqa: E402
+
+
+def joined_load(db, limit: int):
+    """Прежняя стратегия: здание, телефоны и активности одним запросом через JOIN."""
+    return db.query(models.Organization).options(
+        joinedload(models.Organization.building),
+        joinedload(models.Organization.phones),
+        joinedload(models.Organization.activities)
+    ).order_by(models.Organization.id).offset(0).limit(limit).all()
+
+
+def selectin_load(db, limit: int):
+    """ORM-объекты с коллекциями через selectinload (ORGANIZATION_READS=orm)."""
+    return crud.organization_query(db).order_by(models.Organization.id).offset(0).limit(limit).all()
+
+
+def projection_load(db, limit: int):
+    """Только нужные ответу столбцы и групповые запросы связанных данных (ORGANIZATION_READS=projection)."""
+    crud.ORGANIZATION_READS = "projection"
+    return crud.get_organizations(db, limit=limit)
+
+
+STRATEGIES = {
+    "joinedload": joined_load,
+    "selectinload": selectin_load,
+    "projection": projection_load,
+}
+
+
+def populate(session, organizations: int, per_organization: int):
+    """Создает организации, у каждой из которых per_organization телефонов и активностей."""
+    session.execute(insert(models.Building), [{"id": 1, "address": "Building", "latitude": 55.0, "longitude": 37.0}])
+    session.execute(insert(models.Activity), [
+        {"id": i + 1, "name": f"Activity {i + 1}"} for i in range(per_organization)
+    ])
+    session.execute(insert(models.Organization), [
+        {"id": i + 1, "name": f"Organization {i + 1}", "building_id": 1} for i in range(organizations)
+    ])
+    session.execute(insert(models.OrganizationPhone), [
+        {"organization_id": i + 1, "phone_number": f"8-800-{i:05d}-{j}"}
+        for i in range(organizations) for j in range(per_organization)
+    ])
+    session.execute(insert(models.OrganizationActivity), [
+        {"organization_id": i + 1, "activity_id": j + 1}
+        for i in range(organizations) for j in range(per_organization)
+    ])
+    session.commit()
+
+
+def count_rows(engine, statements):
+    """Повторно выполняет перехваченные запросы и считает возвращенные базой строки."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        total = 0
+        for statement, parameters in statements:
+            cursor.execute(statement, parameters)
+            total += len(cursor.fetchall())
+        return total
+    finally:
+        raw.close()
+
+
+def run(per_organization: int, organizations: int, limit: int, repeat: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        make_session = sessionmaker(bind=engine)
+        with make_session() as session:
+            populate(session, organizations, per_organization)
+
+        for name, strategy in STRATEGIES.items():
+            statements = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                statements.append((statement, parameters))
+
+            event.listen(engine, "before_cursor_execute", capture)
+            with make_session() as session:
+                strategy(session, limit)
+            event.remove(engine, "before_cursor_execute", capture)
+            rows = count_rows(engine, statements)
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                with make_session() as session:
+                    strategy(session, limit)
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+
+            tracemalloc.start()
+            with make_session() as session:
+                strategy(session, limit)
+                peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            results[name] = (len(statements), rows, elapsed, peak_kib)
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-organization", type=int, nargs="+", default=[1, 5, 10],
+                        help="Число телефонов и активностей у каждой организации")
+    parser.add_argument("--organizations", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'per org':>8} | {'strategy':>12} | {'queries':>7} | {'rows':>7} | {'ms':>8} | {'peak KiB':>9}")
+    for per_organization in args.per_organization:
+        results = run(per_organization, args.organizations, args.limit, args.repeat)
+        for name, (queries, rows, elapsed, peak_kib) in results.items():
+            print(f"{per_organization:>8} | {name:>12} | {queries:>7} | {rows:>7} | {elapsed:>8.2f} | {peak_kib:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
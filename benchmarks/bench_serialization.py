@@ -0,0 +1,136 @@
+"""
+Бенчмарк сериализации ответов: быстрая сериализация по полям схем (RESPONSE_SERIALIZATION=fast)
+против валидации схем pydantic и response_model FastAPI (RESPONSE_SERIALIZATION=pydantic).
+
+Запросы выполняются последовательно в одном процессе, поэтому результат — запросы в секунду на одно ядро.
+Отдельно измеряется только преобразование страницы организаций в JSON (без HTTP и базы данных): словарей
+при ORGANIZATION_READS=projection (по умолчанию) или ORM-объектов при ORGANIZATION_READS=orm.
+
+Запуск:
+    python benchmarks/bench_serialization.py --limit 100 --requests 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ACTIVITY_CACHE", "0")
+os.environ.setdefault("SUGGEST_INDEX", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from typing import List  # noqa: E402
+
+from app import crud, models, schemas, serialization  # noqa: E402
+from app.database import Base, get_db, get_read_db  # noqa: E402
+from app.dependencies import api_key_auth  # noqa: E402
+from app.main import app  # noqa: E402
+
+MODES = ("pydantic", "fast")
+
+
+def populate(session, organizations: int, per_organization: int):
+    """Создает организации, у каждой из которых per_organization телефонов и активностей (с дочерними)."""
+    session.execute(insert(models.Building), [{"id": 1, "address": "Building", "latitude": 55.0, "longitude": 37.0}])
+    session.execute(insert(models.Activity), [
+        {"id": i + 1, "name": f"Activity {i + 1}"} for i in range(per_organization)
+    ] + [
+        {"id": per_organization + i + 1, "name": f"Child {i + 1}", "parent_id": i + 1} for i in range(per_organization)
+    ])
+    session.execute(insert(models.Organization), [
+        {"id": i + 1, "name": f"Организация {i + 1}", "building_id": 1} for i in range(organizations)
+    ])
+    session.execute(insert(models.OrganizationPhone), [
+        {"organization_id": i + 1, "phone_number": f"8-800-{i:05d}-{j}"}
+        for i in range(organizations) for j in range(per_organization)
+    ])
+    session.execute(insert(models.OrganizationActivity), [
+        {"organization_id": i + 1, "activity_id": j + 1}
+        for i in range(organizations) for j in range(per_organization)
+    ])
+    session.commit()
+
+
+def encode(mode: str, organizations):
+    """Преобразует страницу организаций в JSON так же, как это делает соответствующий путь ответа."""
+    schema = List[schemas.Organization]
+    if mode == "fast":
+        return serialization.dumps(serialization.dump(schema, organizations))
+    adapter = TypeAdapter(schema)
+    return serialization.dumps(adapter.dump_python(adapter.validate_python(organizations, from_attributes=True),
+                                                   mode="json"))
+
+
+def run(organizations: int, per_organization: int, limit: int, requests: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine)
+        make_session = sessionmaker(bind=engine, autoflush=False)
+        with make_session() as session:
+            populate(session, organizations, per_organization)
+
+        def override_db():
+            with make_session() as db:
+                yield db
+
+        async def skip_auth():
+            return True
+
+        app.dependency_overrides[get_db] = override_db
+        app.dependency_overrides[get_read_db] = override_db
+        app.dependency_overrides[api_key_auth] = skip_auth
+        try:
+            with make_session() as session:
+                page = crud.get_organizations(session, limit=limit)
+                if crud.ORGANIZATION_READS == "orm":
+                    # Загружаем дочерние активности заранее: измеряется только сериализация.
+                    # Словари ORGANIZATION_READS=projection уже содержат деревья целиком.
+                    for organization in page:
+                        for activity in organization.activities:
+                            activity.children
+                with TestClient(app) as client:
+                    bodies = {}
+                    for mode in MODES:
+                        serialization.RESPONSE_SERIALIZATION = mode
+                        url = f"/organizations/?limit={limit}"
+                        bodies[mode] = client.get(url).content
+                        started = time.perf_counter()
+                        for _ in range(requests):
+                            client.get(url)
+                        rps = requests / (time.perf_counter() - started)
+
+                        started = time.perf_counter()
+                        for _ in range(requests):
+                            encode(mode, page)
+                        encode_ms = (time.perf_counter() - started) / requests * 1000
+                        results[mode] = (rps, encode_ms)
+                    assert bodies["fast"] == bodies["pydantic"], "Ответы различаются"
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--organizations", type=int, default=1000)
+    parser.add_argument("--per-organization", type=int, default=3,
+                        help="Число телефонов и активностей у каждой организации")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    results = run(args.organizations, args.per_organization, args.limit, args.requests)
+    print(f"{'mode':>8} | {'req/s per core':>14} | {'encode ms':>9}")
+    for mode, (rps, encode_ms) in results.items():
+        print(f"{mode:>8} | {rps:>14.1f} | {encode_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Бенчмарк подсказок: время ответа индекса подсказок (SUGGEST_INDEX=1) и запроса к базе данных по началу имени.
+
+Измеряются медиана и 99-й перцентиль одного вызова crud.get_suggestions для случайных префиксов
+длиной 1–4 символа (без HTTP).
+
+Запуск:
+    python benchmarks/bench_suggest.py --names 100000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud, models  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.suggest_index import suggest_index  # noqa: E402
+
+WORDS = ("Рога", "Копыта", "Молоко", "Мясная", "Лавка", "Автосервис", "Alpha", "Beta", "Store", "Market", "Ёлка")
+
+
+def populate(session, names: int):
+    """Создает names организаций из случайных сочетаний слов и 1000 видов деятельности."""
+    rng = random.Random(1)
+    session.execute(insert(models.Building), [{"id": 1, "address": "Building", "latitude": 55.0, "longitude": 37.0}])
+    session.execute(insert(models.Organization), [
+        {"id": i + 1, "name": " ".join(rng.sample(WORDS, 3)) + f" {i}", "building_id": 1} for i in range(names)
+    ])
+    session.execute(insert(models.Activity), [{"id": i + 1, "name": f"{rng.choice(WORDS)} {i}"} for i in range(1000)])
+    session.commit()
+
+
+def measure(session, prefixes, limit: int):
+    """Возвращает (медиана, p99) времени одного вызова в миллисекундах."""
+    timings = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        crud.get_suggestions(session, prefix, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    prefixes = [rng.choice(WORDS)[:rng.randint(1, 4)].lower() for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        with sessionmaker(bind=engine)() as session:
+            populate(session, args.names)
+            started = time.perf_counter()
+            suggest_index.load(session)
+            print(f"index build: {(time.perf_counter() - started) * 1000:.0f} ms, {len(suggest_index)} names")
+            print(f"{'source':>8} | {'median ms':>9} | {'p99 ms':>8}")
+            for source in ("index", "database"):
+                if source == "database":
+                    suggest_index.clear()
+                median, p99 = measure(session, prefixes, args.limit)
+                print(f"{source:>8} | {median:>9.3f} | {p99:>8.3f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Потоковая загрузка зданий, видов деятельности, организаций и телефонов из файла CSV или NDJSON.
+
+Каждая запись — объект с полем type:
+    {"type": "activity", "key": "food", "name": "Еда"}
+    {"type": "activity", "key": "meat", "name": "Мясная продукция", "parent": "food"}
+    {"type": "building", "key": "b1", "address": "г. Москва, ул. Ленина 1", "latitude": 55.75, "longitude": 37.61}
+    {"type": "organization", "key": "o1", "name": "Рога и Копыта", "building": "b1", "activities": ["meat"],
+     "phones": ["2-222-222"]}
+    {"type": "phone", "organization": "o1", "phone_number": "3-333-333"}
+
+Ссылки (parent, building, activities, organization) — ключи key записей выше по файлу. В CSV те же поля
+являются столбцами (лишние остаются пустыми), списки activities и phones разделяются символом «|».
+
+Запуск:
+    python import_data.py data.ndjson
+    python import_data.py data.csv --batch-size 20000 --resume
+"""
+import argparse
+import sys
+
+from app.database import SessionLocal
+from app.importer import run_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="по умолчанию — по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=10000, help="записей в одной транзакции")
+    parser.add_argument("--checkpoint", help="файл контрольной точки (по умолчанию <path>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="продолжить с записи из контрольной точки")
+    args = parser.parse_args()
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    errors = 0
+
+    def on_error(index, error):
+        nonlocal errors
+        errors += 1
+        print(f"record {index}: {error}", file=sys.stderr)
+
+    def progress(importer, elapsed):
+        print(f"records: {importer.offset}, rows: {importer.rows}, errors: {errors}, "
+              f"{importer.rows / elapsed if elapsed else 0:.0f} rows/s", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        run_import(db, args.path, file_format, args.batch_size, args.checkpoint or f"{args.path}.checkpoint",
+                   args.resume, progress, on_error)
+    finally:
+        db.close()
+    print("Загрузка завершена." if not errors else f"Загрузка завершена, пропущено записей: {errors}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Table change counters for ETag versions
+
+Revision ID: 4b8e2f7c1d90
+Revises: a3f19d6e4b27
+Create Date: 2026-10-18 16:05:27.402000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e2f7c1d90'
+down_revision: Union[str, None] = 'a3f19d6e4b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('activities', 'buildings', 'organizations', 'organization_phones', 'organization_activities')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=63), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Счетчик изменений каждой таблицы; его увеличивают триггеры (см. app.crud.get_table_versions).
+    for table in TABLES:
+        op.execute(f"INSERT INTO table_versions (name, version) VALUES ('{table}', 0)")
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Триггеры уровня команды: одно обновление счетчика на INSERT/UPDATE/DELETE/COPY, а не на каждую строку.
+        op.execute(
+            'CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+            'UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME; RETURN NULL; END $$'
+        )
+        for table in TABLES:
+            op.execute(
+                f'CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} '
+                f'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()'
+            )
+    elif dialect == 'sqlite':
+        # В SQLite есть только триггеры уровня строки.
+        for table in TABLES:
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                op.execute(
+                    f'CREATE TRIGGER {table}_version_{operation.lower()} AFTER {operation} ON {table} BEGIN '
+                    f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"
+                )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'postgresql':
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_version ON {table}')
+        elif dialect == 'sqlite':
+            for operation in ('insert', 'update', 'delete'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_version_{operation}')
+    if dialect == 'postgresql':
+        op.execute('DROP FUNCTION IF EXISTS bump_table_version()')
+    op.drop_table('table_versions')
@@ -0,0 +1,72 @@
+"""Name search indexes for organizations and activities
+
+Revision ID: 5e0b7c2d9a41
+Revises: 830b8dad223f
+Create Date: 2026-10-18 13:40:12.215000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0b7c2d9a41'
+down_revision: Union[str, None] = '830b8dad223f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('organizations', 'activities')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'postgresql':
+        # GIN-индексы pg_trgm ускоряют ILIKE '%...%' (см. app.search.name_search). Если расширение
+        # недоступно (например, нет прав на CREATE EXTENSION), поиск остается на ILIKE без индекса.
+        try:
+            with bind.begin_nested():
+                op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except sa.exc.DBAPIError:
+            return
+        for table in TABLES:
+            op.execute(f'CREATE INDEX ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)')
+    elif dialect == 'sqlite':
+        # Индексы FTS5 с токенизатором trigram (SQLite 3.34+) и триггеры, поддерживающие их в актуальном состоянии.
+        # Если сборка SQLite не поддерживает FTS5 или trigram, поиск остается на LIKE.
+        try:
+            with bind.begin_nested():
+                for table in TABLES:
+                    fts = f'{table}_fts'
+                    op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', "
+                               f"tokenize='trigram')")
+                    op.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+                    op.execute(
+                        f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN '
+                        f'INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name); END'
+                    )
+                    op.execute(
+                        f'CREATE TRIGGER {fts}_update AFTER UPDATE OF name ON {table} BEGIN '
+                        f"INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+                        f'INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name); END'
+                    )
+                    op.execute(
+                        f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN '
+                        f"INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name); END"
+                    )
+        except sa.exc.OperationalError:
+            pass
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_trgm')
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for event in ('delete', 'update', 'insert'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{event}')
+            op.execute(f'DROP TABLE IF EXISTS {table}_fts')
@@ -0,0 +1,54 @@
+"""Activity closure table
+
+Revision ID: 830b8dad223f
+Revises: c815161dd5ad
+Create Date: 2026-10-18 11:03:27.540000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '830b8dad223f'
+down_revision: Union[str, None] = 'c815161dd5ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # В SQLite DDL неудачного запуска не откатывается: удаляем оставшуюся таблицу, чтобы миграцию можно
+    # было повторить (до этой ревизии таблицы activity_closure нет).
+    op.execute('DROP TABLE IF EXISTS activity_closure')
+    op.create_table('activity_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['activities.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['activities.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index(op.f('ix_activity_closure_descendant_id'), 'activity_closure', ['descendant_id'], unique=False)
+
+    # Заполняем таблицу замыкания для уже существующих активностей. path — ID на пути от предка:
+    # рекурсия не заходит в активность, уже лежащую на пути, поэтому цикл в parent_id (например,
+    # активность — свой собственный родитель) не зацикливает запрос и не дает повторных строк.
+    op.execute(
+        'WITH RECURSIVE tree(ancestor_id, descendant_id, depth, path) AS ('
+        " SELECT id, id, 0, ',' || CAST(id AS VARCHAR(20)) || ',' FROM activities"
+        ' UNION ALL'
+        ' SELECT tree.ancestor_id, activities.id, tree.depth + 1,'
+        " tree.path || CAST(activities.id AS VARCHAR(20)) || ','"
+        ' FROM tree JOIN activities ON activities.parent_id = tree.descendant_id'
+        " WHERE tree.path NOT LIKE '%,' || CAST(activities.id AS VARCHAR(20)) || ',%'"
+        ') '
+        'INSERT INTO activity_closure (ancestor_id, descendant_id, depth) '
+        'SELECT ancestor_id, descendant_id, depth FROM tree'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_activity_closure_descendant_id'), table_name='activity_closure')
+    op.drop_table('activity_closure')
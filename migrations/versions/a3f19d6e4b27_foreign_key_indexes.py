@@ -0,0 +1,37 @@
+"""Foreign key indexes
+
+Revision ID: a3f19d6e4b27
+Revises: 5e0b7c2d9a41
+Create Date: 2026-10-18 14:22:05.731000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f19d6e4b27'
+down_revision: Union[str, None] = '5e0b7c2d9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Организации здания (by_building, геозапросы по найденным зданиям).
+    op.create_index(op.f('ix_organizations_building_id'), 'organizations', ['building_id'], unique=False)
+    # Телефоны организаций страницы (WHERE organization_id IN (...)).
+    op.create_index(op.f('ix_organization_phones_organization_id'), 'organization_phones', ['organization_id'],
+                    unique=False)
+    # Организации по активности (by_activity, nearest с activity_ids); первичный ключ начинается с organization_id.
+    op.create_index('ix_organization_activities_activity_id', 'organization_activities',
+                    ['activity_id', 'organization_id'], unique=False)
+    # Дочерние активности (рекурсивный CTE по parent_id, Activity.children).
+    op.create_index(op.f('ix_activities_parent_id'), 'activities', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_activities_parent_id'), table_name='activities')
+    op.drop_index('ix_organization_activities_activity_id', table_name='organization_activities')
+    op.drop_index(op.f('ix_organization_phones_organization_id'), table_name='organization_phones')
+    op.drop_index(op.f('ix_organizations_building_id'), table_name='organizations')
@@ -0,0 +1,61 @@
+"""Spatial indexes for buildings
+
+Revision ID: c815161dd5ad
+Revises: 19cd24a72749
+Create Date: 2026-10-18 10:12:41.318000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c815161dd5ad'
+down_revision: Union[str, None] = '19cd24a72749'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Составной B-tree индекс для отбора по прямоугольнику (работает на любой СУБД).
+    op.create_index('ix_buildings_latitude_longitude', 'buildings', ['latitude', 'longitude'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # GiST-индекс по точке: используется оператором point <@ box (см. app.geo.candidate_filter).
+        op.execute('CREATE INDEX ix_buildings_location_gist ON buildings USING gist (point(longitude, latitude))')
+    elif dialect == 'sqlite':
+        # R-tree индекс и триггеры, поддерживающие его в актуальном состоянии.
+        op.execute('CREATE VIRTUAL TABLE buildings_rtree USING rtree(id, min_lat, max_lat, min_long, max_long)')
+        op.execute(
+            'INSERT INTO buildings_rtree (id, min_lat, max_lat, min_long, max_long) '
+            'SELECT id, latitude, latitude, longitude, longitude FROM buildings'
+        )
+        op.execute(
+            'CREATE TRIGGER buildings_rtree_insert AFTER INSERT ON buildings BEGIN '
+            'INSERT INTO buildings_rtree (id, min_lat, max_lat, min_long, max_long) '
+            'VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END'
+        )
+        op.execute(
+            'CREATE TRIGGER buildings_rtree_update AFTER UPDATE OF latitude, longitude ON buildings BEGIN '
+            'UPDATE buildings_rtree SET min_lat = new.latitude, max_lat = new.latitude, '
+            'min_long = new.longitude, max_long = new.longitude WHERE id = new.id; END'
+        )
+        op.execute(
+            'CREATE TRIGGER buildings_rtree_delete AFTER DELETE ON buildings BEGIN '
+            'DELETE FROM buildings_rtree WHERE id = old.id; END'
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX ix_buildings_location_gist')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER buildings_rtree_delete')
+        op.execute('DROP TRIGGER buildings_rtree_update')
+        op.execute('DROP TRIGGER buildings_rtree_insert')
+        op.execute('DROP TABLE buildings_rtree')
+
+    op.drop_index('ix_buildings_latitude_longitude', table_name='buildings')
@@ -1,5 +1,5 @@
 from app.database import SessionLocal
-from app import models, schemas
+from app import models, schemas, crud
 from sqlalchemy.orm import Session
 
 
@@ -45,7 +45,7 @@ def seed_data(db: Session):
                     parent_name = "Запчасти"
                     break
                 elif a["parent_id"] == 7 and act_data["parent_id"] == 7:
-                    parent_name = "Аксессуары"
+                    parent_name = "Запчасти"
                     break
                 elif a["parent_id"] == 9 and act_data["parent_id"] == 9:
                     parent_name = "Электроника"
@@ -57,6 +57,7 @@ def seed_data(db: Session):
             current = activities_by_name[act_data["name"]]
             current.parent_id = parent.id
     db.commit()
+    crud.rebuild_activity_closure(db)  # parent_id проставлены напрямую, поэтому пересчитываем таблицу замыкания
 
     # Добавляем здания
     buildings = [